@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from django.db import close_old_connections
+from django.urls import URLPattern
+from asgiref.sync import sync_to_async
+
+from utils.constans import ASYNC_READ_WORKERS
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+ASYNC_READ_ROUTES = (
+    'recipes-list',
+    'recipes-detail',
+    'tags-list',
+    'tags-detail',
+    'ingredients-list',
+    'ingredients-detail',
+    'users-subscriptions',
+)
+
+read_executor = ThreadPoolExecutor(
+    max_workers=ASYNC_READ_WORKERS, thread_name_prefix='api-read')
+
+
+def run_view(view, request, *args, **kwargs):
+    """Выполняет синхронную вьюху и рендерит ответ в потоке пула."""
+
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """Async-вариант DRF-вьюхи для ASGI.
+
+    Чтение выполняется в ограниченном пуле потоков, поэтому медленный
+    запрос или клиент не занимает воркер целиком. Запись идет обычным
+    путем Django для синхронных вьюх. Ответ тот же, что у исходной вьюхи.
+    """
+
+    read = sync_to_async(run_view, thread_sensitive=False,
+                         executor=read_executor)
+    write = sync_to_async(view)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await read(view, request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    return async_view
+
+
+def with_async_reads(urlpatterns, names=ASYNC_READ_ROUTES):
+    """Заменяет вьюхи горячих маршрутов чтения на async-варианты."""
+
+    return [
+        URLPattern(pattern.pattern, async_read_view(pattern.callback),
+                   pattern.default_args, pattern.name)
+        if isinstance(pattern, URLPattern) and pattern.name in names
+        else pattern
+        for pattern in urlpatterns
+    ]
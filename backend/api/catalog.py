@@ -0,0 +1,195 @@
+import threading
+from bisect import bisect_left, insort
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient, Tag
+from utils.cache import get_version, last_bump
+from utils.constans import FUZZY_SEARCH_THRESHOLD
+from .serializers import IngredientSerializer, TagSerializer
+
+
+def normalize_name(name):
+    """Ключ для сравнения названий без учёта регистра и различия е/ё."""
+
+    return name.strip().casefold().replace('ё', 'е')
+
+
+def trigrams(name):
+    """Триграммы слов названия, как их считает pg_trgm."""
+
+    result = set()
+    for word in name.split():
+        padded = f'  {word} '
+        result.update(
+            padded[index:index + 3] for index in range(len(padded) - 2)
+        )
+    return result
+
+
+class Catalog:
+    """Справочник в памяти процесса.
+
+    Хранит строки таблицы кортежами, упорядоченный по названию индекс
+    и отрендеренный JSON всего списка. Целиком перестраивается, когда
+    версия данных меняется в другом процессе; изменения, сделанные
+    в этом процессе, применяются к индексу на месте.
+    """
+
+    def __init__(self, namespace, queryset, serializer_class):
+        self.namespace = namespace
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self.fields = serializer_class.Meta.fields
+        self.version = None
+        self.rows = {}
+        self.keys = []
+        self.payload = None
+        self.trigram_index = None
+        self.lock = threading.RLock()
+
+    def refresh(self):
+        version = get_version(self.namespace)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.load(version)
+        return self
+
+    def load(self, version):
+        if self.version is None:
+            self.connect()
+        data = self.serializer_class(self.queryset.all(), many=True).data
+        rows = [tuple(item[field] for field in self.fields) for item in data]
+        self.rows = {row[0]: row for row in rows}
+        self.keys = sorted(self.key(row) for row in rows)
+        self.payload = None
+        self.trigram_index = None
+        self.version = version
+
+    def connect(self):
+        model = self.queryset.model
+        post_save.connect(self.saved, sender=model, weak=False,
+                          dispatch_uid=f'{self.namespace}_catalog_saved')
+        post_delete.connect(self.deleted, sender=model, weak=False,
+                            dispatch_uid=f'{self.namespace}_catalog_deleted')
+
+    def key(self, row):
+        return normalize_name(row[1]), row[0]
+
+    def to_dict(self, row):
+        return dict(zip(self.fields, row))
+
+    def render(self, rows):
+        return JSONRenderer().render([self.to_dict(row) for row in rows])
+
+    def get_payload(self):
+        with self.lock:
+            if self.payload is None:
+                self.payload = self.render(
+                    self.rows[pk] for _, pk in self.keys)
+            return self.payload
+
+    def get(self, pk):
+        row = self.rows.get(pk)
+        if row is None:
+            return None
+        return self.to_dict(row)
+
+    def search(self, prefix, limit):
+        """Первые limit строк, название которых начинается с prefix."""
+
+        prefix = normalize_name(prefix)
+        keys = self.keys
+        rows = []
+        for index in range(bisect_left(keys, (prefix,)), len(keys)):
+            name, pk = keys[index]
+            if not name.startswith(prefix) or len(rows) == limit:
+                break
+            rows.append(self.rows[pk])
+        return rows
+
+    def get_trigram_index(self):
+        with self.lock:
+            if self.trigram_index is None:
+                index = {}
+                for name, pk in self.keys:
+                    for trigram in trigrams(name):
+                        index.setdefault(trigram, []).append(pk)
+                self.trigram_index = index
+            return self.trigram_index
+
+    def fuzzy_search(self, query, limit):
+        """Ранжированный поиск с учётом опечаток.
+
+        Сначала совпадения по началу названия, затем по подстроке, затем
+        названия, похожие по триграммам, в порядке убывания сходства.
+        """
+
+        query = normalize_name(query)
+        rows = self.search(query, limit)
+        found = {row[0] for row in rows}
+        for name, pk in self.keys:
+            if len(rows) == limit:
+                return rows
+            if pk not in found and query in name:
+                rows.append(self.rows[pk])
+                found.add(pk)
+        query_trigrams = trigrams(query)
+        shared = {}
+        for trigram in query_trigrams:
+            for pk in self.get_trigram_index().get(trigram, ()):
+                if pk not in found:
+                    shared[pk] = shared.get(pk, 0) + 1
+        similar = []
+        for pk, count in shared.items():
+            name = normalize_name(self.rows[pk][1])
+            similarity = count / len(query_trigrams | trigrams(name))
+            if similarity >= FUZZY_SEARCH_THRESHOLD:
+                similar.append((-similarity, name, pk))
+        similar.sort()
+        rows.extend(self.rows[pk] for _, _, pk in similar[:limit - len(rows)])
+        return rows
+
+    def discard(self, pk):
+        row = self.rows.pop(pk, None)
+        if row is not None:
+            key = self.key(row)
+            del self.keys[bisect_left(self.keys, key)]
+
+    def apply(self, change):
+        """Применяет изменение к индексу, если он не отстал от базы.
+
+        Вызывается после фиксации транзакции, следом за сдвигом версии;
+        при откате индекс не меняется.
+        """
+
+        previous, version = last_bump(self.namespace)
+        with self.lock:
+            if self.version is None or self.version != previous:
+                return
+            change()
+            self.payload = None
+            self.trigram_index = None
+            self.version = version
+
+    def saved(self, sender, instance, **kwargs):
+        data = self.serializer_class(instance).data
+        row = tuple(data[field] for field in self.fields)
+
+        def change():
+            self.discard(row[0])
+            self.rows[row[0]] = row
+            insort(self.keys, self.key(row))
+        transaction.on_commit(lambda: self.apply(change))
+
+    def deleted(self, sender, instance, **kwargs):
+        pk = instance.pk
+        transaction.on_commit(lambda: self.apply(lambda: self.discard(pk)))
+
+
+tags_catalog = Catalog('tags', Tag.objects.all(), TagSerializer)
+ingredients_catalog = Catalog(
+    'ingredients', Ingredient.objects.all(), IngredientSerializer)
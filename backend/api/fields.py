@@ -1,17 +1,63 @@
 import base64
+import binascii
+from tempfile import SpooledTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files import File
+from PIL import Image, UnidentifiedImageError
 from rest_framework import serializers
 
+from utils.constans import (BASE64_CHUNK_SIZE, IMAGE_FORMATS,
+                            MAX_IMAGE_DIMENSION, MAX_IMAGE_SIZE)
+
 
 class Base64ImageField(serializers.ImageField):
-    """Сериализатор для поля картинки в формате Base64."""
+    """Сериализатор для поля картинки в формате Base64.
+
+    Картинка декодируется частями во временный файл, размер и разрешение
+    проверяются до того, как Pillow загрузит изображение целиком.
+    """
+
+    default_error_messages = {
+        'too_large': 'Размер картинки не должен превышать {max_size} байт.',
+        'too_big': ('Разрешение картинки не должно превышать '
+                    '{max_dimension}x{max_dimension}.'),
+        'format': 'Допустимые форматы картинки: {formats}.',
+        'base64': 'Картинка должна быть закодирована в base64.',
+    }
+
+    def decode(self, imgstr, ext):
+        if len(imgstr) // 4 * 3 > MAX_IMAGE_SIZE + 2:
+            self.fail('too_large', max_size=MAX_IMAGE_SIZE)
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        try:
+            for start in range(0, len(imgstr), BASE64_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    imgstr[start:start + BASE64_CHUNK_SIZE], validate=True))
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('base64')
+        if file.tell() > MAX_IMAGE_SIZE:
+            file.close()
+            self.fail('too_large', max_size=MAX_IMAGE_SIZE)
+        file.seek(0)
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except (UnidentifiedImageError, OSError):
+            width = height = 0
+        if max(width, height) > MAX_IMAGE_DIMENSION:
+            file.close()
+            self.fail('too_big', max_dimension=MAX_IMAGE_DIMENSION)
+        file.seek(0)
+        return File(file, name='temp.' + ext)
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr),
-                               name='temp.' + ext
-                               )
+            ext = format.split('/')[-1].lower()
+            if ext not in IMAGE_FORMATS:
+                self.fail('format', formats=', '.join(IMAGE_FORMATS))
+            data = self.decode(imgstr, ext)
         return super().to_internal_value(data)
@@ -2,6 +2,7 @@ from django_filters import rest_framework as filters
 from django_filters.rest_framework import FilterSet
 
 from recipes.models import Ingredient, Recipe
+from recipes.search import search_recipes
 
 
 class IngredientSearchFilter(filters.FilterSet):
@@ -23,6 +24,7 @@ class RecipeSearchFilter(FilterSet):
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
@@ -40,3 +42,6 @@ class RecipeSearchFilter(FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(shopping_cart=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
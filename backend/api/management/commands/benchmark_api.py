@@ -0,0 +1,440 @@
+import gc
+import json
+import logging
+from collections import namedtuple
+from io import StringIO
+from itertools import count
+from math import ceil
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter, sleep
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+from utils.cache import VERSION_KEY
+from utils.constans import (BENCHMARK_BASELINE, BENCHMARK_BYTES_TOLERANCE,
+                            BENCHMARK_LATENCY_SLACK, BENCHMARK_REPEAT,
+                            BENCHMARK_SETTLE_TIMEOUT, BENCHMARK_TOLERANCE)
+
+# Данные для generate_data: базовая линия снимается на них же.
+BENCHMARK_DATA = {
+    'users': 200,
+    'recipes': 1000,
+    'favorites': 10000,
+    'cart': 2000,
+    'subscriptions': 2000,
+    'seed': 0,
+}
+BENCHMARK_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+# Лог SQL из настроек искажал бы замер.
+SQL_LOGGERS = ('django.db.backends', 'django.db.backends.schema')
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1Pe'
+         'AAAADElEQVR4nGP4z8AAAAMBAQDJ/pLvAAAAAElFTkSuQmCC')
+
+# before и after - запросы вокруг замеряемого, которые в замер не входят:
+# (метод, путь, ключ тела запроса). Тело, которое должно меняться
+# от запроса к запросу, задается функцией.
+Route = namedtuple(
+    'Route',
+    ('name', 'method', 'path', 'budget', 'data', 'before', 'after',
+     'anonymous'),
+    defaults=(None, None, None, False),
+)
+RECIPE = '/api/recipes/{recipe}/'
+SUBSCRIBE = '/api/users/{author}/subscribe/'
+ROUTES = (
+    Route('recipes', 'get', '/api/recipes/', 7),
+    Route('recipes anonymous', 'get', '/api/recipes/', 5, anonymous=True),
+    Route('recipes cursor', 'get', '/api/recipes/?pagination=cursor', 6),
+    Route('recipes ?tags', 'get', '/api/recipes/?tags={tag}', 8),
+    Route('recipes ?author', 'get', '/api/recipes/?author={author}', 8),
+    Route('recipes ?is_favorited', 'get',
+          '/api/recipes/?is_favorited=1', 7),
+    Route('recipes ?is_in_shopping_cart', 'get',
+          '/api/recipes/?is_in_shopping_cart=1', 7),
+    Route('recipes ?search', 'get', '/api/recipes/?search={word}', 7),
+    Route('recipe detail', 'get', RECIPE, 6),
+    Route('recipe create', 'post', '/api/recipes/', 13, 'recipe',
+          after=('delete', '/api/recipes/{created}/', None)),
+    Route('recipe update', 'patch', '/api/recipes/{own}/', 15, 'recipe'),
+    Route('recipe delete', 'delete', '/api/recipes/{created}/', 21,
+          before=('post', '/api/recipes/', 'recipe')),
+    Route('favorite add', 'post', RECIPE + 'favorite/', 5,
+          after=('delete', RECIPE + 'favorite/', None)),
+    Route('favorite remove', 'delete', RECIPE + 'favorite/', 4,
+          before=('post', RECIPE + 'favorite/', None)),
+    Route('shopping_cart add', 'post', RECIPE + 'shopping_cart/', 8,
+          after=('delete', RECIPE + 'shopping_cart/', None)),
+    Route('shopping_cart remove', 'delete', RECIPE + 'shopping_cart/', 7,
+          before=('post', RECIPE + 'shopping_cart/', None)),
+    Route('bulk_favorite add', 'post', '/api/recipes/bulk_favorite/', 5,
+          'ids', after=('delete', '/api/recipes/bulk_favorite/', 'ids')),
+    Route('bulk_favorite remove', 'delete', '/api/recipes/bulk_favorite/',
+          5, 'ids', before=('post', '/api/recipes/bulk_favorite/', 'ids')),
+    Route('bulk_shopping_cart add', 'post',
+          '/api/recipes/bulk_shopping_cart/', 8, 'ids',
+          after=('delete', '/api/recipes/bulk_shopping_cart/', 'ids')),
+    Route('bulk_shopping_cart remove', 'delete',
+          '/api/recipes/bulk_shopping_cart/', 8, 'ids',
+          before=('post', '/api/recipes/bulk_shopping_cart/', 'ids')),
+    Route('download_shopping_cart', 'get',
+          '/api/recipes/download_shopping_cart/', 2),
+    Route('download_shopping_cart pdf', 'get',
+          '/api/recipes/download_shopping_cart/?format=pdf', 2),
+    Route('tags', 'get', '/api/tags/', 2),
+    Route('tag detail', 'get', '/api/tags/{tag_id}/', 2),
+    Route('ingredients', 'get', '/api/ingredients/', 2),
+    Route('ingredients search', 'get', '/api/ingredients/?name={prefix}', 2),
+    Route('ingredients fuzzy search', 'get',
+          '/api/ingredients/?name={prefix}&mode=fuzzy', 2),
+    Route('ingredient detail', 'get', '/api/ingredients/{ingredient}/', 2),
+    Route('users', 'get', '/api/users/', 4),
+    Route('user detail', 'get', '/api/users/{author}/', 3),
+    Route('users me', 'get', '/api/users/me/', 2),
+    Route('subscriptions', 'get', '/api/users/subscriptions/', 5),
+    Route('subscribe', 'post', SUBSCRIBE, 9,
+          after=('delete', SUBSCRIBE, None)),
+    Route('unsubscribe', 'delete', SUBSCRIBE, 7,
+          before=('post', SUBSCRIBE, None)),
+    Route('set_password', 'post', '/api/users/set_password/', 2,
+          'password'),
+    Route('token login', 'post', '/api/auth/token/login/', 3, 'login',
+          anonymous=True),
+    # Новые пользователи попали бы в ответы остальных маршрутов,
+    # поэтому регистрация замеряется последней.
+    Route('sign up', 'post', '/api/users/', 5, 'signup', anonymous=True),
+)
+
+
+def percentile(samples, share):
+    samples = sorted(samples)
+    return samples[max(ceil(share * len(samples)) - 1, 0)]
+
+
+def wait_thumbnails(recipe_id, timeout=BENCHMARK_SETTLE_TIMEOUT):
+    """Ожидание фоновых миниатюр: на SQLite их запись, пересекшись
+    с записью запроса, кончается ошибкой database is locked."""
+
+    deadline = perf_counter() + timeout
+    recipes = Recipe.objects.filter(pk=recipe_id)
+    while perf_counter() < deadline and recipes.filter(
+            Q(thumbnail='') | Q(thumbnail__isnull=True)).exists():
+        sleep(0.01)
+
+
+def read_body(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+class Command(BaseCommand):
+    help = ('Замер задержки, числа SQL-запросов и размера ответа '
+            'маршрутов API на сгенерированных данных SQLite.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--baseline',
+            default=settings.BASE_DIR / BENCHMARK_BASELINE,
+            help='JSON-файл базовой линии.'
+        )
+        parser.add_argument(
+            '--save',
+            action='store_true',
+            help='Записать результаты как новую базовую линию.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=BENCHMARK_REPEAT,
+            help='Сколько раз замерять каждый маршрут.'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=BENCHMARK_TOLERANCE,
+            help='Допустимый рост p50 (доля).'
+        )
+        parser.add_argument(
+            '--latency-advisory',
+            action='store_true',
+            help='Рост задержки только выводить, не считая ошибкой '
+                 '(для CI на общих машинах с нестабильным временем).'
+        )
+        parser.add_argument(
+            '--warm',
+            action='store_true',
+            help='Не очищать кэш ответов перед каждым запросом.'
+        )
+        parser.add_argument(
+            '--route',
+            action='append',
+            help='Замерить только маршруты с этим названием.'
+        )
+        parser.add_argument(
+            '--data',
+            default=settings.BASE_DIR.parent / 'data',
+            help='Каталог с ingredients.csv.'
+        )
+
+    def seed(self, data):
+        """Справочники и данные generate_data во временной базе."""
+
+        call_command('load_csv', path=data, stdout=StringIO())
+        if not Ingredient.objects.exists():
+            raise CommandError(f'В {data} нет ingredients.csv.')
+        Tag.objects.bulk_create(
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in BENCHMARK_TAGS
+        )
+        call_command('generate_data', stdout=StringIO(), **BENCHMARK_DATA)
+
+    def prepare(self):
+        """Пользователь, от имени которого идут запросы, и объекты,
+        которых еще нет в его избранном, корзине и подписках."""
+
+        user = User.objects.annotate(
+            carts=Count('shopping_cart')).order_by('-carts', 'id').first()
+        user.set_password(self.password)
+        user.save()
+        others = Recipe.objects.exclude(author=user).exclude(
+            favorites=user).exclude(shopping_cart=user).order_by('id')
+        ingredients = list(Ingredient.objects.order_by('id')[:3])
+        tag = Tag.objects.order_by('id').first()
+        self.client = Client(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}')
+        self.anonymous = Client()
+        self.payloads = {
+            'recipe': {
+                'name': 'Рецепт для замера',
+                'text': 'Описание рецепта для замера.',
+                'cooking_time': 30,
+                'image': IMAGE,
+                'tags': [tag.id],
+                'ingredients': [
+                    {'id': ingredient.id, 'amount': 100}
+                    for ingredient in ingredients
+                ],
+            },
+            'ids': {'ids': list(others[1:11].values_list('id', flat=True))},
+            'login': {'email': user.email, 'password': self.password},
+            'password': {'new_password': self.password,
+                         'current_password': self.password},
+            'signup': self.signup,
+        }
+        self.signups = count()
+        self.version_keys = [
+            VERSION_KEY.format(namespace) for namespace in (
+                'recipes', 'tags', 'ingredients', f'user:{user.pk}')
+        ]
+        self.context = {
+            'recipe': others.first().id,
+            'author': User.objects.exclude(pk=user.pk).exclude(
+                author__subscriber=user).order_by('-recipes_count', 'id')
+            .first().id,
+            'tag': tag.slug,
+            'tag_id': tag.id,
+            'ingredient': ingredients[0].id,
+            'prefix': ingredients[0].name[:3],
+            'word': Recipe.objects.order_by('id').first().name.split()[0],
+        }
+        self.call_unmeasured(('post', '/api/recipes/', 'recipe'))
+        self.context['own'] = self.context['created']
+
+    def signup(self):
+        number = next(self.signups)
+        return {
+            'username': f'benchmark{number}',
+            'email': f'benchmark{number}@example.com',
+            'first_name': 'Замер',
+            'last_name': 'Регистрации',
+            'password': self.password,
+        }
+
+    def call(self, request, anonymous=False):
+        method, path, data = request
+        client = self.anonymous if anonymous else self.client
+        payload = self.payloads[data] if data else None
+        if callable(payload):
+            payload = payload()
+        response = client.generic(
+            method.upper(),
+            path.format(**self.context),
+            json.dumps(payload) if data else '',
+            content_type='application/json',
+        )
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method.upper()} {path}: {response.status_code} '
+                f'{read_body(response)[:200]!r}')
+        return response
+
+    def settle(self, response):
+        """Запоминает id созданного объекта и ждет его миниатюр."""
+
+        if (response.get('Content-Type') != 'application/json'
+                or not response.content):
+            return
+        result = response.json()
+        if isinstance(result, dict) and 'id' in result:
+            self.context['created'] = result['id']
+            if result.get('image') and not result.get('thumbnail'):
+                wait_thumbnails(result['id'])
+
+    def call_unmeasured(self, request):
+        self.settle(self.call(request))
+
+    def clear_responses(self):
+        """Очищает кэш ответов, сохраняя версии данных.
+
+        Без версий справочники в памяти перестраивались бы перед каждым
+        замером, как после правки.
+        """
+
+        versions = cache.get_many(self.version_keys)
+        cache.clear()
+        cache.set_many(versions, None)
+
+    def measure(self, route, repeat, warm):
+        samples = []
+        for attempt in range(repeat + 1):
+            if not warm:
+                self.clear_responses()
+            if route.before:
+                self.call_unmeasured(route.before)
+            gc.collect()
+            gc.disable()
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    start = perf_counter()
+                    response = self.call(
+                        (route.method, route.path, route.data),
+                        route.anonymous)
+                    body = read_body(response)
+                    elapsed = (perf_counter() - start) * 1000
+            finally:
+                gc.enable()
+            query_count = len(queries)
+            self.settle(response)
+            if route.after:
+                self.call_unmeasured(route.after)
+            if attempt:
+                samples.append(elapsed)
+        return {
+            'p50': round(percentile(samples, 0.5), 3),
+            'p95': round(percentile(samples, 0.95), 3),
+            'queries': query_count,
+            'bytes': len(body),
+        }
+
+    def run(self, routes, options):
+        results = {}
+        with TemporaryDirectory() as tmp, override_settings(
+                MEDIA_ROOT=tmp, JOBS_ENABLED=False):
+            connection.settings_dict['TEST']['NAME'] = str(
+                Path(tmp) / 'benchmark.sqlite3')
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self.seed(settings.BASE_DIR / options['data'])
+                self.prepare()
+                for route in routes:
+                    results[route.name] = self.measure(
+                        route, options['repeat'], options['warm'])
+                    self.stdout.write(
+                        '{:<32} p50 {p50:>8.2f} мс  p95 {p95:>8.2f} мс  '
+                        '{queries:>3} запр.  {bytes:>8} байт'.format(
+                            route.name, **results[route.name]))
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        return results
+
+    def compare(self, routes, results, baseline, tolerance):
+        """Ошибки по бюджету запросов и базовой линии и отдельно
+        отставания по задержке."""
+
+        errors, slow = [], []
+        for route in routes:
+            result = results[route.name]
+            if result['queries'] > route.budget:
+                errors.append(
+                    f'{route.name}: {result["queries"]} SQL-запросов '
+                    f'при бюджете {route.budget}.')
+            base = baseline.get(route.name)
+            if base is None:
+                continue
+            if result['queries'] > base['queries']:
+                errors.append(
+                    f'{route.name}: SQL-запросов {result["queries"]}, '
+                    f'в базовой линии {base["queries"]}.')
+            if result['bytes'] > base['bytes'] * (
+                    1 + BENCHMARK_BYTES_TOLERANCE):
+                errors.append(
+                    f'{route.name}: ответ {result["bytes"]} байт, '
+                    f'в базовой линии {base["bytes"]}.')
+            limit = base['p50'] * (1 + tolerance) + BENCHMARK_LATENCY_SLACK
+            if result['p50'] > limit:
+                slow.append(
+                    f'{route.name}: p50 {result["p50"]:.2f} мс, '
+                    f'в базовой линии {base["p50"]:.2f} мс.')
+        return errors, slow
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замер идет на SQLite: задайте SQLITE=True.')
+        routes = [
+            route for route in ROUTES
+            if not options['route'] or route.name in options['route']
+        ]
+        self.password = User.objects.make_random_password()
+        baseline_path = settings.BASE_DIR / options['baseline']
+        baseline = {}
+        if baseline_path.exists() and not options['save']:
+            saved = json.loads(baseline_path.read_text(encoding='utf8'))
+            if saved['data'] != BENCHMARK_DATA:
+                raise CommandError(
+                    'Базовая линия снята на других данных, '
+                    'перезапишите ее с --save.')
+            baseline = saved['routes']
+        sql_loggers = [logging.getLogger(name) for name in SQL_LOGGERS]
+        for logger in sql_loggers:
+            logger.disabled = True
+        setup_test_environment()
+        try:
+            results = self.run(routes, options)
+        finally:
+            teardown_test_environment()
+            for logger in sql_loggers:
+                logger.disabled = False
+        errors, slow = self.compare(
+            routes, results, baseline, options['tolerance'])
+        if options['latency_advisory']:
+            for warning in slow:
+                self.stdout.write(self.style.WARNING(warning))
+        else:
+            errors.extend(slow)
+        if options['save'] and not errors:
+            baseline_path.write_text(json.dumps(
+                {'data': BENCHMARK_DATA, 'routes': results},
+                ensure_ascii=False, indent=2) + '\n', encoding='utf8')
+            self.stdout.write(self.style.SUCCESS(
+                f'Базовая линия записана в {baseline_path}.'))
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS('Все маршруты в бюджете.'))
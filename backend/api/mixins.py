@@ -0,0 +1,143 @@
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+from utils.cache import get_version, make_digest, make_key
+from utils.constans import CACHE_TIMEOUT
+
+
+class CachedResponseMixin:
+    """Кэширование ответов list и retrieve для анонимных пользователей.
+
+    Ключ строится из версии данных, адреса сайта (схема и хост входят
+    в абсолютные ссылки ответа), пути и отсортированных параметров
+    запроса. Сигналы сдвигают версию при изменении данных, и старые
+    записи просто перестают читаться. Ответы авторизованным
+    пользователям содержат личные флаги и не кэшируются.
+    """
+
+    cache_namespace = None
+    cache_timeout = CACHE_TIMEOUT
+
+    def get_cache_key(self, request):
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        return make_key(
+            self.cache_namespace,
+            get_version(self.cache_namespace),
+            'anonymous',
+            request.build_absolute_uri('/'),
+            request.path,
+            query,
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, self.cache_timeout)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для list и retrieve.
+
+    Оба заголовка вычисляются по версиям данных, а не по телу ответа,
+    поэтому при совпадении If-None-Match или If-Modified-Since ответ
+    304 отдаётся до запросов к базе и сериализации.
+    """
+
+    version_namespaces = ()
+    user_versioned = False
+
+    def get_versions(self, request):
+        namespaces = list(self.version_namespaces)
+        if self.user_versioned and request.user.is_authenticated:
+            namespaces.append(f'user:{request.user.pk}')
+        return [get_version(namespace) for namespace in namespaces]
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        versions = self.get_versions(request)
+        etag = '"{}"'.format(make_digest(
+            *versions,
+            request.user.pk,
+            request.accepted_renderer.format,
+            request.get_full_path(),
+        ))
+        last_modified = max(versions) // 10 ** 9
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (
+            status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED
+        ):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
+
+
+class CatalogMixin:
+    """Отдача справочника из памяти процесса.
+
+    Список без параметров отдаётся готовыми байтами JSON, отдельный
+    объект собирается из кортежа; запросов к базе и сериализации нет.
+    Запросы с параметрами наследник может обслужить из справочника
+    в catalog_search.
+    """
+
+    catalog = None
+
+    def catalog_search(self, request):
+        """Данные ответа по параметрам запроса или None, если их
+        нужно отдать обычным list."""
+
+        return None
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        if not request.query_params:
+            return HttpResponse(
+                self.catalog.refresh().get_payload(),
+                content_type=request.accepted_renderer.media_type
+            )
+        data = self.catalog_search(request)
+        if data is None:
+            return super().list(request, *args, **kwargs)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            pk = int(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            raise NotFound
+        item = self.catalog.refresh().get(pk)
+        if item is None:
+            raise NotFound
+        return Response(item)
@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 from utils.constans import MAX_PAGE_SIZE
 
@@ -8,3 +8,22 @@ class LimitPagePagination(PageNumberPagination):
 
     page_size = MAX_PAGE_SIZE
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсорная пагинация рецептов по (created, id).
+
+    Включается параметром ?pagination=cursor: не считает COUNT(*)
+    и не использует OFFSET, поэтому глубокие страницы отдаются так же
+    быстро, как первая.
+    """
+
+    page_size = MAX_PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = ('created', 'id')
+    mode_query_param = 'pagination'
+    mode = 'cursor'
+
+    @classmethod
+    def is_requested(cls, request):
+        return request.query_params.get(cls.mode_query_param) == cls.mode
@@ -1,6 +1,5 @@
 from django.contrib.auth.validators import UnicodeUsernameValidator
-from django.db import IntegrityError
-from django.db.models import F
+from django.db import IntegrityError, transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
@@ -8,8 +7,9 @@ from rest_framework.validators import UniqueTogetherValidator
 
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
 from users.models import Subscription, User
-from utils.constans import (MAX_LENGTH, MAX_LENGTH_USER, MAX_VALUE, MIN_VALUE,
-                            RECIPES_LIMIT)
+from utils.constans import (BULK_IDS_LIMIT, MAX_LENGTH, MAX_LENGTH_USER,
+                            MAX_VALUE, MIN_VALUE, RECIPES_LIMIT)
+from utils.services import change_shopping_lists
 from utils.validators import validate_username
 from .fields import Base64ImageField
 
@@ -23,10 +23,25 @@ class RecipeShortListSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'thumbnail',
+            'thumbnail_webp',
             'cooking_time'
         )
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка рецептов для массовых операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=MIN_VALUE),
+        allow_empty=False,
+        max_length=BULK_IDS_LIMIT,
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
 class CustomUserCreateSerializer(UserCreateSerializer):
     """Сериализатор для создания пользователя."""
 
@@ -90,9 +105,22 @@ class CustomUserSerializer(UserSerializer):
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
-        return object.author.filter(
-            subscriber=request.user
-        ).exists()
+        return object.id in self.get_subscribed_authors(request.user)
+
+    def get_subscribed_authors(self, user):
+        """Id авторов, на которых подписан пользователь.
+
+        Загружаются один раз на запрос и хранятся в контексте,
+        общем для вложенных сериализаторов.
+        """
+
+        if 'subscribed_authors' not in self.context:
+            self.context['subscribed_authors'] = set(
+                Subscription.objects.filter(
+                    subscriber=user
+                ).values_list('author_id', flat=True)
+            )
+        return self.context['subscribed_authors']
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -125,7 +153,6 @@ class SubscriptionShowSerializer(CustomUserSerializer):
     """Сериализатор отображения подписок."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -140,26 +167,26 @@ class SubscriptionShowSerializer(CustomUserSerializer):
             'recipes_count'
         )
 
-    def to_representation(self, instance):
-        rep = super().to_representation(instance)
-        request = self.root.context.get('request')
-        if request is not None:
-            count = request.query_params.get('recipes_limit')
-        else:
-            count = self.root.context.get('recipes_limit')
-        if count is not None:
-            rep['recipes'] = rep['recipes'][:int(count)]
-        return rep
+    @staticmethod
+    def get_recipes_limit(request):
+        """Сколько рецептов автора показать (параметр recipes_limit)."""
+
+        try:
+            limit = int(request.query_params['recipes_limit'])
+        except (AttributeError, KeyError, ValueError):
+            return RECIPES_LIMIT
+        return max(min(limit, RECIPES_LIMIT), 0)
 
     def get_recipes(self, object):
-        author_recipes = object.recipes.all()[:RECIPES_LIMIT]
+        if hasattr(object, 'first_recipes'):
+            author_recipes = object.first_recipes
+        else:
+            author_recipes = object.recipes.all()[:self.get_recipes_limit(
+                self.context.get('request'))]
         return RecipeShortListSerializer(
             author_recipes, many=True
         ).data
 
-    def get_recipes_count(self, object):
-        return object.recipes.count()
-
 
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для тегов."""
@@ -220,7 +247,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        exclude = ('favorites', 'shopping_cart')
+        exclude = ('favorites', 'shopping_cart',
+                   'favorites_count', 'shopping_cart_count')
 
     def validate(self, data):
         """Проверка на обновление рецепта
@@ -248,6 +276,12 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 ('Ингредиенты не должны повторяться.')
             )
+        missing = set(ingredients_ids) - set(Ingredient.objects.filter(
+            id__in=ingredients_ids).order_by().values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиентов не существует: {sorted(missing)}'
+            )
         return value
 
     def validate_tags(self, value):
@@ -279,6 +313,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 (f'Ошибка при добавлении ингредиента: {error}')
             )
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -287,13 +322,50 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         self.add_ingredients(recipe, ingredients)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        """Изменение ингредиентов рецепта по разнице со старыми.
+
+        Возвращает изменения количеств {id ингредиента: разница}
+        для оставшихся и новых ингредиентов; удаленные вычитает
+        из списков покупок сигнал post_delete.
+        """
+
+        current = {
+            row.ingredient_id: row for row in recipe.recipe_ingredient.all()
+        }
+        delta = {}
+        changed = []
+        for ingredient in ingredients:
+            ingredient_id, amount = ingredient['id'], ingredient['amount']
+            row = current.get(ingredient_id)
+            delta[ingredient_id] = amount - (row.amount if row else 0)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        removed = current.keys() - {
+            ingredient['id'] for ingredient in ingredients
+        }
+        if removed:
+            recipe.recipe_ingredient.filter(
+                ingredient_id__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        self.add_ingredients(recipe, [
+            ingredient for ingredient in ingredients
+            if ingredient['id'] not in current
+        ])
+        return delta
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         super().update(instance, validated_data)
-        instance.ingredients.clear()
         instance.tags.set(tags)
-        self.add_ingredients(instance, ingredients)
+        change_shopping_lists(
+            instance.shopping_cart.values_list('id', flat=True),
+            self.update_ingredients(instance, ingredients)
+        )
         return instance
 
 
@@ -318,25 +390,35 @@ class RecipeSerializer(RecipeCreateSerializer):
             'text',
             'cooking_time',
             'image',
+            'thumbnail',
+            'thumbnail_webp',
             'author',
             'is_favorited',
             'is_in_shopping_cart'
         )
 
     def get_ingredients(self, obj):
-        return obj.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('recipes_ingredients__amount'))
+        return [
+            {
+                'id': item.ingredient.id,
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in obj.recipe_ingredient.all()
+        ]
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_authenticated:
             return user.favorites.filter(pk=obj.pk).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_authenticated:
             return user.shopping_cart.filter(pk=obj.pk).exists()
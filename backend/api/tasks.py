@@ -0,0 +1,32 @@
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.test import RequestFactory
+
+from jobs.registry import task
+from utils.constans import CACHE_WARM_PAGES, MAX_PAGE_SIZE
+from utils.services import store_shopping_cart_pdf
+from .views import RecipeViewSet
+
+
+@task
+def render_shopping_cart_pdf(key, ingredients):
+    store_shopping_cart_pdf(key, ingredients)
+
+
+@task
+def warm_recipe_pages():
+    """Заполняет кэш первых страниц списка рецептов для анонимов.
+
+    Запросы строятся от публичного адреса CACHE_WARM_URL и передаются
+    прямо во вьюсет, чтобы ключи кэша и абсолютные ссылки совпали
+    с запросами посетителей.
+    """
+
+    url = urlsplit(settings.CACHE_WARM_URL)
+    factory = RequestFactory(HTTP_HOST=url.netloc)
+    view = RecipeViewSet.as_view({'get': 'list'})
+    for page in range(1, CACHE_WARM_PAGES + 1):
+        view(factory.get(
+            '/api/recipes/', {'page': page, 'limit': MAX_PAGE_SIZE},
+            secure=url.scheme == 'https'))
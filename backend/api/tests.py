@@ -0,0 +1,120 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from api.tasks import warm_recipe_pages
+from recipes.models import Recipe, Tag
+from users.models import User
+from utils.constans import MAX_PAGE_SIZE
+
+
+class BulkListTests(TestCase):
+    """Массовые операции отвечают по каждому id, как одиночные запросы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'reader', 'reader@example.com', 'password',
+            first_name='Читатель', last_name='Рецептов')
+        cls.recipes = [
+            Recipe.objects.create(author=cls.user, name=f'Рецепт {number}',
+                                  text='Описание.', cooking_time=10)
+            for number in range(3)
+        ]
+        cls.missing = max(recipe.pk for recipe in cls.recipes) + 1
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def bulk(self, method, ids):
+        response = getattr(self.client, method)(
+            '/api/recipes/bulk_favorite/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['status'] for item in response.json()]
+
+    def favorites_counts(self):
+        return [
+            Recipe.objects.get(pk=recipe.pk).favorites_count
+            for recipe in self.recipes
+        ]
+
+    def test_add(self):
+        self.client.post(f'/api/recipes/{self.recipes[0].pk}/favorite/')
+        statuses = self.bulk('post', [
+            self.recipes[0].pk, self.recipes[1].pk, self.missing])
+        self.assertEqual(statuses, [
+            status.HTTP_400_BAD_REQUEST,
+            status.HTTP_201_CREATED,
+            status.HTTP_404_NOT_FOUND,
+        ])
+        self.assertEqual(self.favorites_counts(), [1, 1, 0])
+
+    def test_remove(self):
+        self.bulk('post', [self.recipes[0].pk])
+        statuses = self.bulk('delete', [
+            self.recipes[0].pk, self.recipes[1].pk, self.missing])
+        self.assertEqual(statuses, [
+            status.HTTP_204_NO_CONTENT,
+            status.HTTP_400_BAD_REQUEST,
+            status.HTTP_404_NOT_FOUND,
+        ])
+        self.assertEqual(self.favorites_counts(), [0, 0, 0])
+
+    def test_repeated_ids_count_once(self):
+        statuses = self.bulk('post', [self.recipes[2].pk] * 2)
+        self.assertEqual(statuses, [status.HTTP_201_CREATED])
+        self.assertEqual(self.favorites_counts(), [0, 0, 1])
+
+    def test_empty_ids(self):
+        response = self.client.post(
+            '/api/recipes/bulk_favorite/', {'ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConditionalGetTests(TestCase):
+    """Правка сразу после ответа не отдаёт устаревший 304."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_edit_within_same_second(self):
+        response = self.client.get('/api/tags/')
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get(
+            '/api/tags/', HTTP_IF_MODIFIED_SINCE=last_modified
+        ).status_code, status.HTTP_304_NOT_MODIFIED)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Ужин', color='#E26C2D', slug='dinner')
+        response = self.client.get(
+            '/api/tags/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 1)
+
+
+@override_settings(ALLOWED_HOSTS=['foodgram.example'],
+                   CACHE_WARM_URL='https://foodgram.example')
+class WarmRecipePagesTests(TestCase):
+    """Прогрев кэша попадает в те же ключи, что и запросы посетителей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            'author', 'author@example.com', 'password',
+            first_name='Автор', last_name='Рецептов')
+        Recipe.objects.create(author=author, name='Пирог', text='Испечь.',
+                              cooking_time=30)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_warmed_page_is_served_from_cache(self):
+        warm_recipe_pages()
+        with self.assertNumQueries(0):
+            response = APIClient().get(
+                '/api/recipes/', {'page': 1, 'limit': MAX_PAGE_SIZE},
+                HTTP_HOST='foodgram.example', secure=True)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], 1)
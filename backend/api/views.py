@@ -1,25 +1,36 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import connection
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import HttpResponse, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
-from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
-from api.pagination import LimitPagePagination
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from api.pagination import LimitPagePagination, RecipeCursorPagination
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import fuzzy_search_ingredients
 from users.models import Subscription, User
-from utils.services import add_or_del_obj
+from utils.constans import INGREDIENTS_SEARCH_LIMIT, PDF_RENDER_TIMEOUT
+from utils.services import (add_or_del_obj, add_to_shopping_list,
+                            bulk_add_or_del_objs, pdf_font_available,
+                            remove_from_shopping_list,
+                            shopping_cart_ingredients, shopping_cart_pdf,
+                            stream_shopping_cart)
+from .catalog import ingredients_catalog, tags_catalog
 from .filters import IngredientSearchFilter, RecipeSearchFilter
+from .mixins import CachedResponseMixin, CatalogMixin, ConditionalGetMixin
 from .permissions import AnonimOrAuthenticatedReadOnly, IsAuthorOrReadOnly
+from .renderers import CSVRenderer, PDFRenderer, TextRenderer
 from .serializers import (CustomUserSerializer, IngredientSerializer,
-                          RecipeCreateSerializer, RecipeSerializer,
-                          RecipeShortListSerializer, SubscriptionSerializer,
-                          SubscriptionShowSerializer, TagSerializer)
+                          RecipeCreateSerializer, RecipeIdsSerializer,
+                          RecipeSerializer, RecipeShortListSerializer,
+                          SubscriptionSerializer, SubscriptionShowSerializer,
+                          TagSerializer)
 
 
 class CustomUserViewSet(UserViewSet):
@@ -98,27 +109,41 @@ class CustomUserViewSet(UserViewSet):
     def get_subscriptions(self, request):
         """Получение подписок на авторов."""
 
-        authors = User.objects.filter(author__subscriber=request.user)
-        paginator = LimitOffsetPagination()
+        authors = User.objects.filter(
+            author__subscriber=request.user
+        ).order_by('id')
+        paginator = LimitPagePagination()
         result_pages = paginator.paginate_queryset(
             queryset=authors, request=request
         )
+        prefetch_related_objects(result_pages, Prefetch(
+            'recipes',
+            queryset=Recipe.objects.filter(
+                author__in=result_pages
+            ).first_per_author(
+                SubscriptionShowSerializer.get_recipes_limit(request)
+            ),
+            to_attr='first_recipes',
+        ))
         serializer = SubscriptionShowSerializer(
-            result_pages, context={'request': request}, many=True
+            result_pages, context=self.get_serializer_context(), many=True
         )
         return paginator.get_paginated_response(serializer.data)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, CatalogMixin, ReadOnlyModelViewSet):
     """ВьюСет для тегов."""
 
     queryset = Tag.objects.all()
     permission_classes = (AllowAny,)
     serializer_class = TagSerializer
     pagination_class = None
+    version_namespaces = ('tags',)
+    catalog = tags_catalog
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, CatalogMixin,
+                        ReadOnlyModelViewSet):
     """ВьюСет для ингридиентов."""
 
     queryset = Ingredient.objects.all()
@@ -128,9 +153,41 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientSearchFilter
     search_fields = ('^name', )
+    version_namespaces = ('ingredients',)
+    catalog = ingredients_catalog
+
+    def catalog_search(self, request):
+        """Поиск по началу названия через индекс справочника.
+
+        С параметром mode=fuzzy поиск ранжированный и допускает опечатки.
+        """
 
+        params = request.query_params
+        name = params.get('name')
+        if not name or set(params) - {'name', 'mode'}:
+            return None
+        if params.get('mode') == 'fuzzy':
+            return self.fuzzy_search(name)
+        catalog = self.catalog.refresh()
+        return [
+            catalog.to_dict(row)
+            for row in catalog.search(name, INGREDIENTS_SEARCH_LIMIT)
+        ]
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def fuzzy_search(self, name):
+        if connection.vendor == 'postgresql':
+            return IngredientSerializer(fuzzy_search_ingredients(
+                self.get_queryset(), name, INGREDIENTS_SEARCH_LIMIT
+            ), many=True).data
+        catalog = self.catalog.refresh()
+        return [
+            catalog.to_dict(row)
+            for row in catalog.fuzzy_search(name, INGREDIENTS_SEARCH_LIMIT)
+        ]
+
+
+class RecipeViewSet(ConditionalGetMixin, CachedResponseMixin,
+                    viewsets.ModelViewSet):
     """ВьюСет для создания рецепта."""
 
     queryset = Recipe.objects.all()
@@ -139,6 +196,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeSearchFilter
     permission_classes = (IsAuthorOrReadOnly,)
+    cache_namespace = 'recipes'
+    version_namespaces = ('recipes',)
+    user_versioned = True
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if RecipeCursorPagination.is_requested(self.request):
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        return Recipe.objects.with_related().with_user_flags(
+            self.request.user)
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -151,7 +224,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(methods=['post', 'delete'], detail=True)
     def favorite(self, request, pk):
         return add_or_del_obj(pk, request, request.user.favorites,
-                              RecipeShortListSerializer)
+                              RecipeShortListSerializer, 'favorites_count')
 
     @action(methods=['get'], detail=True)
     def favorited(self, request):
@@ -166,24 +239,80 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(methods=['post', 'delete'], detail=True)
     def shopping_cart(self, request, pk):
         return add_or_del_obj(pk, request, request.user.shopping_cart,
-                              RecipeShortListSerializer)
+                              RecipeShortListSerializer,
+                              'shopping_cart_count',
+                              on_add=add_to_shopping_list,
+                              on_remove=remove_from_shopping_list)
+
+    def bulk_add_or_del(self, request, field, counter, **callbacks):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return bulk_add_or_del_objs(serializer.validated_data['ids'],
+                                    request, field, counter, **callbacks)
+
+    @action(methods=['post', 'delete'], detail=False,
+            permission_classes=(permissions.IsAuthenticated,))
+    def bulk_favorite(self, request):
+        return self.bulk_add_or_del(request, 'favorites', 'favorites_count')
 
-    @action(methods=['get'], detail=False)
+    @action(methods=['post', 'delete'], detail=False,
+            permission_classes=(permissions.IsAuthenticated,))
+    def bulk_shopping_cart(self, request):
+        return self.bulk_add_or_del(request, 'shopping_cart',
+                                    'shopping_cart_count',
+                                    on_add=add_to_shopping_list,
+                                    on_remove=remove_from_shopping_list)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated,),
+        renderer_classes=(TextRenderer, CSVRenderer, JSONRenderer,
+                          PDFRenderer)
+    )
     def download_shopping_cart(self, request):
-        user = request.user
-        filename = f'{user.username}_shopping_list.txt'
-        ingredients = (RecipeIngredient.objects.filter(
-            recipe__in=request.user.shopping_cart.all())
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(total_amount=Sum('amount')))
-        file_list = []
-        for ingredient_data in ingredients:
-            ingredient = ingredient_data['ingredient__name']
-            amount = ingredient_data['total_amount']
-            unit = ingredient_data['ingredient__measurement_unit']
-            file_list.append(f'{ingredient} - {amount} {unit}.')
-
-            file = HttpResponse('Cписок покупок:\n' + '\n'.join(file_list),
-                                content_type='text/plain')
-            file['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return file
+        """Потоковая выгрузка списка покупок.
+
+        Формат выбирается параметром format (txt, csv, json, pdf)
+        или заголовком Accept, по умолчанию txt.
+        """
+
+        renderer = request.accepted_renderer
+        if renderer.format == 'pdf':
+            return self.shopping_cart_pdf_response(request)
+        # Под ASGI ответ дочитывается в цикле событий, где ORM
+        # недоступен, поэтому строки выбираются здесь, а поток
+        # только форматирует их.
+        ingredients = list(shopping_cart_ingredients(request.user))
+        response = StreamingHttpResponse(
+            stream_shopping_cart(ingredients, renderer.format),
+            content_type=f'{renderer.media_type}; charset=utf-8'
+        )
+        response['Content-Disposition'] = (
+            'attachment; '
+            f'filename="{request.user.username}_shopping_list.'
+            f'{renderer.format}"'
+        )
+        return response
+
+    def shopping_cart_pdf_response(self, request):
+        if not pdf_font_available():
+            return HttpResponse(
+                'PDF недоступен: на сервере нет шрифта PDF_FONT_PATH.',
+                content_type='text/plain; charset=utf-8',
+                status=status.HTTP_406_NOT_ACCEPTABLE,
+            )
+        pdf = shopping_cart_pdf(shopping_cart_ingredients(request.user))
+        if pdf is None:
+            return HttpResponse(
+                'Список покупок готовится, повторите запрос позже.',
+                content_type='text/plain; charset=utf-8',
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': PDF_RENDER_TIMEOUT},
+            )
+        response = HttpResponse(pdf, content_type='application/pdf')
+        response['Content-Disposition'] = (
+            'attachment; '
+            f'filename="{request.user.username}_shopping_list.pdf"'
+        )
+        return response
@@ -3,7 +3,7 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
-from utils.constans import MAX_PAGE_SIZE
+from utils.constans import MAX_PAGE_SIZE, MAX_REQUEST_SIZE
 
 load_dotenv()
 
@@ -15,6 +15,18 @@ DEBUG = os.getenv('DEBUG', 'False') == 'True'
 
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '127.0.0.1,localhost').split(',')
 
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False') == 'True'
+
+# Тяжелая работа идет через очередь (manage.py run_jobs). Воркер и веб
+# обмениваются результатами через кэш, поэтому нужен общий CACHE_BACKEND.
+JOBS_ENABLED = os.getenv('JOBS_ENABLED', 'False') == 'True'
+# Публичный адрес сайта, с которым прогревается кэш. Схема и хост входят
+# в ключ кэша: за HTTPS нужен адрес https://.
+CACHE_WARM_URL = os.getenv('CACHE_WARM_URL', f'http://{ALLOWED_HOSTS[0]}')
+
+# Схему запроса за прокси сообщает заголовок X-Forwarded-Proto.
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
 
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'collected_static'
@@ -22,8 +34,14 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+DATA_UPLOAD_MAX_MEMORY_SIZE = MAX_REQUEST_SIZE
+
 DB_DATA_DIR = BASE_DIR / 'data'
 
+# Шрифт с кириллицей из пакета fonts-dejavu-core.
+PDF_FONT_PATH = os.getenv(
+    'PDF_FONT_PATH', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
@@ -45,6 +63,7 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
@@ -96,6 +115,15 @@ else:
             'PORT': os.getenv('DB_PORT', 5432)
         }
     }
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Кэши, которые не видны из другого процесса.
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Воркер отдает результаты задач через кэш, поэтому с очередью
+    кэш должен быть общим для веб-процессов и воркера."""
+
+    if not settings.JOBS_ENABLED:
+        return []
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in LOCAL_CACHES:
+        return []
+    return [Error(
+        f'JOBS_ENABLED требует общий кэш, а {backend} живет '
+        f'в памяти одного процесса.',
+        hint='Задайте CACHE_BACKEND и CACHE_LOCATION, например '
+             'FileBasedCache в каталоге на общем томе.',
+        id='jobs.E001',
+    )]
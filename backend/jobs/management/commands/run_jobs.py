@@ -0,0 +1,87 @@
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+import django
+from django.core.management import BaseCommand
+
+from jobs.worker import (claim_jobs, finish_job, format_error, prune_jobs,
+                         requeue_stale, run_job)
+from utils.constans import (JOBS_POLL_INTERVAL, JOBS_PRUNE_INTERVAL,
+                            JOBS_WORKERS)
+
+
+class Command(BaseCommand):
+    help = 'Выполнение фоновых задач из очереди в пуле процессов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=JOBS_WORKERS,
+            help='Число процессов.'
+        )
+        parser.add_argument(
+            '--poll',
+            type=float,
+            default=JOBS_POLL_INTERVAL,
+            help='Интервал опроса очереди, секунд.'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и завершиться.'
+        )
+
+    def create_pool(self, workers):
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context('spawn'),
+            initializer=django.setup,
+        )
+
+    def handle(self, *args, **options):
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        workers = options['workers']
+        pool = self.create_pool(workers)
+        running = {}
+        pruned = None
+        try:
+            while True:
+                if (pruned is None
+                        or time.monotonic() - pruned > JOBS_PRUNE_INTERVAL):
+                    prune_jobs()
+                    pruned = time.monotonic()
+                requeue_stale([job.pk for job in running.values()])
+                for job in claim_jobs(worker, workers - len(running)):
+                    running[pool.submit(run_job, job.pk)] = job
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+                done, _ = wait(running, timeout=options['poll'],
+                               return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    job = running.pop(future)
+                    error = future.exception()
+                    finish_job(job, error and format_error(error))
+                    if error is None:
+                        self.stdout.write(f'{job.name} #{job.pk}: готово')
+                    else:
+                        self.stderr.write(f'{job.name} #{job.pk}: {error!r}')
+                    broken = broken or isinstance(error, BrokenProcessPool)
+                if broken:
+                    for job in running.values():
+                        finish_job(job, 'Процесс пула аварийно завершился.')
+                    running.clear()
+                    pool.shutdown(wait=False)
+                    pool = self.create_pool(workers)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.shutdown()
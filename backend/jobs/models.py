@@ -0,0 +1,82 @@
+from django.db import models
+from django.utils import timezone
+
+from utils.constans import JOB_MAX_ATTEMPTS, MAX_LENGTH
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        max_length=MAX_LENGTH,
+        verbose_name='Задача')
+    args = models.JSONField(
+        default=list,
+        verbose_name='Аргументы')
+    dedup_key = models.CharField(
+        max_length=MAX_LENGTH,
+        null=True,
+        blank=True,
+        verbose_name='Ключ дедупликации',
+        help_text='В очереди может быть только одна задача с этим ключом.')
+    status = models.CharField(
+        max_length=16,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус')
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток')
+    max_attempts = models.PositiveSmallIntegerField(
+        default=JOB_MAX_ATTEMPTS,
+        verbose_name='Максимум попыток')
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Запустить не раньше')
+    locked_by = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name='Воркер')
+    locked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Взята в работу')
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка')
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создана')
+    finished = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Завершена')
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ('-created',)
+        indexes = (
+            models.Index(fields=('status', 'run_at'),
+                         name='job_status_run_at_idx'),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('dedup_key',),
+                condition=models.Q(status='pending'),
+                name='unique_pending_job_dedup_key'),
+        )
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
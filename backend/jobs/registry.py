@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from utils.constans import JOB_MAX_ATTEMPTS
+from .models import Job
+
+registry = {}
+
+
+def task(func):
+    """Регистрирует функцию как фоновую задачу.
+
+    Имя задачи — путь к функции, например 'recipes.tasks.create_thumbnails'.
+    Модули tasks всех приложений загружаются при старте.
+    """
+
+    func.task_name = f'{func.__module__}.{func.__name__}'
+    registry[func.task_name] = func
+    return func
+
+
+def get_task(name):
+    return registry[name]
+
+
+def enqueue(name, *args, dedup_key=None, delay=0,
+            max_attempts=JOB_MAX_ATTEMPTS):
+    """Ставит задачу в очередь и возвращает ее.
+
+    Пока в очереди ждет задача с тем же dedup_key, новая не создается,
+    а возвращается ожидающая. Задача пишется в текущей транзакции, поэтому
+    видна воркеру только после ее коммита.
+    """
+
+    if callable(name):
+        name = name.task_name
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                name=name,
+                args=list(args),
+                dedup_key=dedup_key,
+                run_at=timezone.now() + timedelta(seconds=delay),
+                max_attempts=max_attempts,
+            )
+    except IntegrityError:
+        if dedup_key is None:
+            raise
+        return Job.objects.filter(
+            dedup_key=dedup_key, status=Job.PENDING).first()
@@ -0,0 +1,118 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.registry import enqueue, get_task, task
+from jobs.worker import claim_jobs, finish_job, prune_jobs, requeue_stale
+from utils.constans import JOB_KEEP_FAILED, JOB_TIMEOUT
+
+
+@task
+def noop():
+    pass
+
+
+class JobQueueTests(TestCase):
+    """Постановка, захват, повтор и дедупликация задач."""
+
+    def test_registry(self):
+        self.assertIs(get_task('jobs.tests.noop'), noop)
+        self.assertEqual(enqueue(noop).name, 'jobs.tests.noop')
+
+    def test_dedup_while_pending(self):
+        first = enqueue(noop, dedup_key='noop')
+        self.assertEqual(enqueue(noop, dedup_key='noop'), first)
+        self.assertEqual(Job.objects.count(), 1)
+        claim_jobs('worker', 1)
+        second = enqueue(noop, dedup_key='noop')
+        self.assertNotEqual(second, first)
+        self.assertEqual(second.status, Job.PENDING)
+
+    def test_claim_ready_jobs_once(self):
+        ready = enqueue(noop)
+        enqueue(noop, delay=60)
+        claimed = claim_jobs('worker', 10)
+        self.assertEqual(claimed, [ready])
+        job = claimed[0]
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertEqual(job.locked_by, 'worker')
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(claim_jobs('other', 10), [])
+
+    def test_claim_limit(self):
+        for _ in range(3):
+            enqueue(noop)
+        self.assertEqual(len(claim_jobs('worker', 2)), 2)
+        self.assertEqual(claim_jobs('worker', 0), [])
+
+    def test_done(self):
+        enqueue(noop)
+        job, = claim_jobs('worker', 1)
+        finish_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertIsNotNone(job.finished)
+
+    def test_retry_then_fail(self):
+        enqueue(noop, max_attempts=2)
+        job, = claim_jobs('worker', 1)
+        finish_job(job, 'ошибка')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.last_error, 'ошибка')
+        self.assertGreater(job.run_at, timezone.now())
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        job, = claim_jobs('worker', 1)
+        self.assertEqual(job.attempts, 2)
+        finish_job(job, 'ошибка')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_retry_yields_to_queued_duplicate(self):
+        enqueue(noop, dedup_key='noop')
+        job, = claim_jobs('worker', 1)
+        enqueue(noop, dedup_key='noop')
+        finish_job(job, 'ошибка')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(
+            Job.objects.filter(status=Job.PENDING).count(), 1)
+
+    def test_stale_job_held_by_worker_is_kept(self):
+        enqueue(noop)
+        job, = claim_jobs('worker', 1)
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=JOB_TIMEOUT + 1))
+        requeue_stale(held=[job.pk])
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.RUNNING)
+        requeue_stale()
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.PENDING)
+
+    def test_old_attempt_does_not_finish_new_one(self):
+        enqueue(noop)
+        first, = claim_jobs('worker', 1)
+        Job.objects.filter(pk=first.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=JOB_TIMEOUT + 1))
+        requeue_stale()
+        Job.objects.filter(pk=first.pk).update(run_at=timezone.now())
+        second, = claim_jobs('worker', 1)
+        finish_job(first)
+        self.assertEqual(Job.objects.get(pk=first.pk).status, Job.RUNNING)
+        finish_job(second)
+        self.assertEqual(Job.objects.get(pk=first.pk).status, Job.DONE)
+
+    def test_prune(self):
+        old = timezone.now() - timedelta(seconds=JOB_KEEP_FAILED + 1)
+        for status in (Job.DONE, Job.FAILED):
+            job = enqueue(noop)
+            Job.objects.filter(pk=job.pk).update(status=status, finished=old)
+        enqueue(noop)
+        recent = enqueue(noop)
+        Job.objects.filter(pk=recent.pk).update(
+            status=Job.DONE, finished=timezone.now())
+        self.assertEqual(prune_jobs(), 2)
+        self.assertEqual(
+            sorted(Job.objects.values_list('status', flat=True)),
+            [Job.DONE, Job.PENDING])
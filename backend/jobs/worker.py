@@ -0,0 +1,107 @@
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from utils.constans import (JOB_KEEP_DONE, JOB_KEEP_FAILED, JOB_RETRY_DELAY,
+                            JOB_TIMEOUT)
+from .models import Job
+from .registry import get_task
+
+
+def claim_jobs(worker, limit):
+    """Забирает до limit готовых задач в работу воркеру worker."""
+
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Job.objects.filter(status=Job.PENDING, run_at__lte=now)
+            .order_by('run_at', 'id')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:limit]
+        )
+        Job.objects.filter(id__in=ids, status=Job.PENDING).update(
+            status=Job.RUNNING,
+            locked_by=worker,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+    return list(Job.objects.filter(
+        id__in=ids, status=Job.RUNNING, locked_by=worker, locked_at=now))
+
+
+def run_job(job_id):
+    """Выполняет задачу в процессе пула."""
+
+    try:
+        job = Job.objects.get(pk=job_id)
+        get_task(job.name)(*job.args)
+    finally:
+        connections.close_all()
+
+
+def format_error(error):
+    return ''.join(
+        traceback.format_exception(type(error), error, error.__traceback__))
+
+
+def finish_job(job, error=None):
+    """Отмечает результат задачи; упавшая задача ставится на повтор.
+
+    Меняется только та попытка, которую выполнял воркер: если задачу
+    уже вернули в очередь и взяли снова, результат старой попытки
+    отбрасывается.
+    """
+
+    jobs = Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING,
+        attempts=job.attempts, locked_by=job.locked_by)
+    now = timezone.now()
+    if error is None:
+        jobs.update(status=Job.DONE, finished=now, last_error='')
+        return
+    if job.attempts < job.max_attempts:
+        try:
+            with transaction.atomic():
+                jobs.update(
+                    status=Job.PENDING,
+                    locked_by='',
+                    run_at=now + timedelta(
+                        seconds=JOB_RETRY_DELAY * 2 ** (job.attempts - 1)),
+                    last_error=error,
+                )
+            return
+        except IntegrityError:
+            error += '\nПовтор не нужен: такая задача уже в очереди.'
+    jobs.update(status=Job.FAILED, finished=now, last_error=error)
+
+
+def requeue_stale(held=()):
+    """Возвращает задачи, воркер которых пропал, как неудачную попытку.
+
+    held - id задач, которые вызывающий воркер еще выполняет.
+    """
+
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(seconds=JOB_TIMEOUT),
+    ).exclude(pk__in=held)
+    for job in stale:
+        finish_job(job, 'Задача не завершилась за отведенное время.')
+
+
+def prune_jobs():
+    """Удаляет давно завершенные задачи, чтобы очередь не росла."""
+
+    now = timezone.now()
+    return Job.objects.filter(
+        status=Job.DONE,
+        finished__lt=now - timedelta(seconds=JOB_KEEP_DONE),
+    ).delete()[0] + Job.objects.filter(
+        status=Job.FAILED,
+        finished__lt=now - timedelta(seconds=JOB_KEEP_FAILED),
+    ).delete()[0]
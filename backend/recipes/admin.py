@@ -14,9 +14,6 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('name', 'author', 'tags',)
     inlines = [RecipeIngredientInline, ]
 
-    def favorites_count(self, obj):
-        return obj.favorites.count()
-
 
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
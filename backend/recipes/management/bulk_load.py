@@ -0,0 +1,126 @@
+from itertools import islice
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.models import Ingredient, Tag
+from utils.cache import bump_version_on_commit
+from utils.constans import IMPORT_BATCH_SIZE
+
+# (имя файла без расширения, модель, поля, ключ для --upsert)
+DATASETS = (
+    ('ingredients', Ingredient, ('name', 'measurement_unit'), 'name'),
+    ('tags', Tag, ('name', 'color', 'slug'), 'slug'),
+)
+
+
+def batches(rows, size):
+    """Разбивка потока строк на списки по size штук."""
+
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class BulkLoadCommand(BaseCommand):
+    """Потоковая загрузка справочников пачками.
+
+    Наследник задает расширение файлов и метод read,
+    который лениво отдает строки файла словарями.
+    """
+
+    extension = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=settings.BASE_DIR / 'data',
+            help='Каталог с файлами данных.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Сколько строк вставлять за один запрос.'
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help='Обновлять уже загруженные записи, если они изменились.'
+        )
+
+    def read(self, file, fields):
+        raise NotImplementedError
+
+    def upsert(self, model, fields, key, batch):
+        """Обновление изменившихся записей пачки.
+
+        Запись обновляется, только если и в пачке, и в базе
+        ей соответствует ровно одна строка с тем же ключом.
+        Возвращает число обновленных записей и строки для вставки.
+        """
+
+        rows = {}
+        for row in batch:
+            rows.setdefault(row[key], []).append(row)
+        existing = {}
+        for obj in model.objects.filter(**{f'{key}__in': rows}):
+            existing.setdefault(getattr(obj, key), []).append(obj)
+        changed, new = [], []
+        for value, group in rows.items():
+            objs = existing.get(value, ())
+            if len(group) != 1 or len(objs) != 1:
+                new.extend(group)
+                continue
+            obj, row = objs[0], group[0]
+            if any(getattr(obj, field) != row[field] for field in fields):
+                for field in fields:
+                    setattr(obj, field, row[field])
+                changed.append(obj)
+        if changed:
+            model.objects.bulk_update(changed, fields)
+        return len(changed), new
+
+    @transaction.atomic
+    def import_data(self, file_path, model, fields, key, options):
+        start = perf_counter()
+        before = model.objects.count()
+        total = updated = 0
+        with open(file_path, 'r', encoding='utf8', newline='') as file:
+            for batch in batches(self.read(file, fields),
+                                 options['batch_size']):
+                total += len(batch)
+                if options['upsert']:
+                    changed, batch = self.upsert(model, fields, key, batch)
+                    updated += changed
+                model.objects.bulk_create(
+                    (model(**row) for row in batch),
+                    batch_size=options['batch_size'],
+                    ignore_conflicts=True
+                )
+        created = model.objects.count() - before
+        if created or updated:
+            # bulk_create и bulk_update не шлют post_save: справочники
+            # в памяти и кэш ответов устаревают только по версии.
+            bump_version_on_commit('ingredients', 'tags', 'recipes')
+        elapsed = perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'{file_path.name}: прочитано {total}, добавлено {created}, '
+            f'обновлено {updated} за {elapsed:.2f} с '
+            f'({total / max(elapsed, 1e-6):.0f} строк/с).'
+        ))
+
+    def handle(self, *args, **options):
+        path = settings.BASE_DIR / options['path']
+        for name, model, fields, key in DATASETS:
+            file_path = path / f'{name}.{self.extension}'
+            if not file_path.exists():
+                self.stdout.write(self.style.WARNING(
+                    f'Файл {file_path} не найден, пропускаю.'))
+                continue
+            self.import_data(file_path, model, fields, key, options)
@@ -0,0 +1,186 @@
+import random
+from itertools import accumulate
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import transaction
+
+from recipes.management.bulk_load import batches
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import Subscription, User
+from utils.cache import bump_version_on_commit
+from utils.constans import (GENERATE_INGREDIENTS, GENERATE_MAX_MISSES,
+                            GENERATE_SKEW, GENERATE_TAGS, IMPORT_BATCH_SIZE,
+                            MAX_VALUE)
+
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Олег', 'Елена', 'Петр', 'Ольга',
+               'Сергей', 'Дарья', 'Павел')
+LAST_NAMES = ('Иванова', 'Смирнов', 'Кузнецова', 'Попов', 'Соколова',
+              'Лебедев', 'Козлова', 'Новиков', 'Морозова', 'Волков')
+DISHES = ('Суп', 'Салат', 'Пирог', 'Рагу', 'Каша', 'Запеканка', 'Омлет',
+          'Паста', 'Плов', 'Блины')
+
+
+def skewed(rng, ids, skew=GENERATE_SKEW):
+    """Накопленные веса распределения Ципфа по случайно
+    перемешанным ids: несколько записей популярны, остальные редки."""
+
+    ids = list(ids)
+    rng.shuffle(ids)
+    return ids, list(accumulate(1 / rank ** skew
+                                for rank in range(1, len(ids) + 1)))
+
+
+def unique_pairs(rng, left, right, count, allow_same=True):
+    """До count неповторяющихся пар (left, right) из двух распределений.
+
+    Если пары перестают находиться, их меньше, чем просили.
+    """
+
+    pairs = set()
+    misses = 0
+    while len(pairs) < count and misses < GENERATE_MAX_MISSES:
+        need = count - len(pairs)
+        found = len(pairs)
+        pairs.update(
+            pair for pair in zip(rng.choices(*left, k=need),
+                                 rng.choices(*right, k=need))
+            if allow_same or pair[0] != pair[1]
+        )
+        misses = misses + 1 if len(pairs) == found else 0
+    return sorted(pairs)
+
+
+class Command(BaseCommand):
+    help = ('Генерация пользователей, рецептов, избранного, корзин '
+            'и подписок для нагрузочного тестирования.')
+
+    def add_arguments(self, parser):
+        for name, default in (('users', 1000), ('recipes', 5000),
+                              ('favorites', 50000), ('cart', 10000),
+                              ('subscriptions', 10000)):
+            parser.add_argument(
+                f'--{name}', type=int, default=default,
+                help=f'Сколько записей создать (по умолчанию {default}).')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора: с тем же зерном данные повторяются.')
+        parser.add_argument(
+            '--password', default='password',
+            help='Пароль всех созданных пользователей.')
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help='Сколько строк вставлять за один запрос.')
+
+    def report(self, label, count, start):
+        elapsed = perf_counter() - start
+        self.stdout.write(
+            f'{label}: {count} за {elapsed:.2f} с '
+            f'({count / max(elapsed, 1e-6):.0f} строк/с).'
+        )
+
+    def insert(self, label, model, rows):
+        """Вставка строк пачками, не собирая все объекты в памяти."""
+
+        start = perf_counter()
+        count = 0
+        for batch in batches(rows, self.batch_size):
+            model.objects.bulk_create(batch)
+            count += len(batch)
+        self.report(label, count, start)
+
+    def generated(self, queryset, field='username'):
+        """Id созданных этим запуском записей в порядке вставки."""
+
+        return list(queryset.filter(**{
+            f'{field}__startswith': self.prefix
+        }).order_by('id').values_list('id', flat=True))
+
+    def create_users(self, rng, count, password):
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Данные с зерном {self.seed} уже сгенерированы.')
+        password = make_password(password)
+        self.insert('Пользователи', User, (
+            User(
+                username=f'{self.prefix}{number}',
+                email=f'{self.prefix}{number}@example.com',
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                password=password,
+            )
+            for number in range(count)
+        ))
+        return self.generated(User.objects)
+
+    def create_recipes(self, rng, count, users):
+        authors = skewed(rng, users)
+        self.insert('Рецепты', Recipe, (
+            Recipe(
+                author_id=author_id,
+                name=f'{rng.choice(DISHES)} №{number}',
+                text=f'Описание рецепта №{number}.',
+                cooking_time=min(int(rng.lognormvariate(3.4, 0.6)) + 1,
+                                 MAX_VALUE),
+            )
+            for number, author_id in enumerate(
+                rng.choices(*authors, k=count))
+        ))
+        return self.generated(Recipe.objects, 'author__username')
+
+    def create_recipe_relations(self, rng, recipes):
+        ingredients = skewed(rng, Ingredient.objects.order_by(
+            'id').values_list('id', flat=True))
+        tags = list(Tag.objects.order_by('id').values_list('id', flat=True))
+        self.insert('Ингредиенты рецептов', RecipeIngredient, (
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=pk,
+                             amount=rng.randint(1, 500))
+            for recipe_id in recipes
+            for pk in sorted(set(rng.choices(
+                *ingredients, k=rng.randint(*GENERATE_INGREDIENTS))))
+        ))
+        self.insert('Теги рецептов', Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=pk)
+            for recipe_id in recipes
+            for pk in sorted(rng.sample(
+                tags, min(len(tags), rng.randint(*GENERATE_TAGS))))
+        ))
+
+    def create_user_lists(self, rng, users, recipes, options):
+        for label, field, count in (
+            ('Избранное', 'favorites', options['favorites']),
+            ('Корзины', 'shopping_cart', options['cart']),
+        ):
+            through = getattr(Recipe, field).through
+            self.insert(label, through, (
+                through(user_id=user_id, recipe_id=recipe_id)
+                for user_id, recipe_id in unique_pairs(
+                    rng, skewed(rng, users), skewed(rng, recipes), count)
+            ))
+        self.insert('Подписки', Subscription, (
+            Subscription(subscriber_id=subscriber_id, author_id=author_id)
+            for subscriber_id, author_id in unique_pairs(
+                rng, skewed(rng, users), skewed(rng, users),
+                options['subscriptions'], allow_same=False)
+        ))
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        if not Ingredient.objects.exists():
+            raise CommandError(
+                'Нет ингредиентов: сначала выполните load_csv или load_json.')
+        self.seed = options['seed']
+        self.prefix = f'gen{self.seed}_'
+        self.batch_size = options['batch_size']
+        rng = random.Random(self.seed)
+        start = perf_counter()
+        users = self.create_users(rng, options['users'], options['password'])
+        recipes = self.create_recipes(rng, options['recipes'], users)
+        self.create_recipe_relations(rng, recipes)
+        self.create_user_lists(rng, users, recipes, options)
+        call_command('recount_counters', stdout=self.stdout)
+        call_command('rebuild_shopping_lists', stdout=self.stdout)
+        bump_version_on_commit('recipes')
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные сгенерированы за {perf_counter() - start:.2f} с.'))
@@ -1,41 +1,17 @@
-
 import csv
 
-from django.conf import settings
-from django.core.management.base import BaseCommand
-
-from tqdm import tqdm
+from recipes.management.bulk_load import BulkLoadCommand
 
-from recipes.models import Ingredient, Tag
 
-
-class Command(BaseCommand):
+class Command(BulkLoadCommand):
     help = 'Загрузка CSV-файлов в базу данных.'
 
-    def import_data(self, file_path, model, fields):
-        if model.objects.all().exists():
-            self.stdout.write(self.style.SUCCESS('Данные уже загружены.'))
-        else:
-            with open(file_path, 'r', encoding='utf8', newline='') as file:
-                reader = csv.DictReader(file)
-                total_items = sum(1 for _ in reader)
-                for i, row in tqdm(enumerate(reader, 1), total=total_items,
-                                   desc='Загрузка данных'):
-                    self.stdout.write(f'Загрузка данных {i} из {total_items}',
-                                      ending='\r')
-                    obj, created = model.objects.get_or_create(
-                        **{field: row[field] for field in fields})
-                self.stdout.write(
-                    self.style.SUCCESS('Данные успешно загружены!'))
+    extension = 'csv'
+
+    def read(self, file, fields):
+        """Строки CSV-файла; заголовок с именами полей необязателен."""
 
-    def handle(self, *args, **kwargs):
-        self.import_data(
-            file_path=settings.BASE_DIR / 'data/ingredients.csv',
-            model=Ingredient,
-            fields=['name', 'measurement_unit']
-        )
-        self.import_data(
-            file_path=settings.BASE_DIR / 'data/tags.csv',
-            model=Tag,
-            fields=['name', 'color', 'slug']
-        )
+        for row in csv.reader(file):
+            if not row or tuple(row) == fields:
+                continue
+            yield dict(zip(fields, row))
@@ -1,36 +1,34 @@
 import json
 
-from django.conf import settings
-from django.core.management import BaseCommand
-from recipes.models import Ingredient, Tag
+from recipes.management.bulk_load import BulkLoadCommand
+from utils.constans import IMPORT_READ_SIZE
 
 
-class Command(BaseCommand):
+class Command(BulkLoadCommand):
     help = 'Загрузка JSON-файлов в базу данных.'
 
-    def import_data(self, file_path, model, fields):
-        if model.objects.all().exists():
-            self.stdout.write(self.style.SUCCESS('Данные уже загружены.'))
-        else:
-            with open(file_path, 'r', encoding='utf8') as file:
-                data = json.load(file)
-                total_items = len(data)
-                for i, item in enumerate(data, 1):
-                    self.stdout.write(f'Загрузка данных {i} из {total_items}',
-                                      ending='\r')
-                    obj, created = model.objects.get_or_create(
-                        **{field: item[field] for field in fields})
-                self.stdout.write(
-                    self.style.SUCCESS('Данные успешно загружены!'))
+    extension = 'json'
 
-    def handle(self, *args, **kwargs):
-        self.import_data(
-            file_path=settings.BASE_DIR / 'data/ingredients.json',
-            model=Ingredient,
-            fields=['name', 'measurement_unit']
-        )
-        self.import_data(
-            file_path=settings.BASE_DIR / 'data/tags.json',
-            model=Tag,
-            fields=['name', 'color', 'slug']
-        )
+    def read(self, file, fields):
+        """Элементы JSON-массива, разбираемые по мере чтения файла."""
+
+        decoder = json.JSONDecoder()
+        buffer, position, eof = '', 0, False
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,[':
+                position += 1
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    if buffer[position:].strip():
+                        raise
+                    return
+                chunk = file.read(IMPORT_READ_SIZE)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield {field: item[field] for field in fields}
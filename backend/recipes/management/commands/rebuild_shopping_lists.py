@@ -0,0 +1,67 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import RecipeIngredient, ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = ('Пересчет списков покупок пользователей '
+            'по рецептам в корзине.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить списки, не исправляя их.'
+        )
+
+    def expected(self):
+        return {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in RecipeIngredient.objects
+            .filter(recipe__shopping_cart__isnull=False)
+            .values('recipe__shopping_cart', 'ingredient')
+            .annotate(total=Sum('amount'))
+            .values_list('recipe__shopping_cart', 'ingredient', 'total')
+            .order_by()
+            .iterator()
+        }
+
+    def actual(self):
+        return {
+            (row.user_id, row.ingredient_id): row
+            for row in ShoppingCartIngredient.objects.iterator()
+        }
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        expected = self.expected()
+        actual = self.actual()
+        missing = [
+            ShoppingCartIngredient(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount)
+            for (user_id, ingredient_id), amount in expected.items()
+            if (user_id, ingredient_id) not in actual
+        ]
+        extra = [
+            row.pk for key, row in actual.items() if key not in expected
+        ]
+        wrong = []
+        for key, row in actual.items():
+            if key in expected and row.amount != expected[key]:
+                row.amount = expected[key]
+                wrong.append(row)
+        self.stdout.write(
+            f'Недостает строк: {len(missing)}, лишних: {len(extra)}, '
+            f'с неверным количеством: {len(wrong)}.'
+        )
+        if not (missing or extra or wrong):
+            self.stdout.write(self.style.SUCCESS('Списки покупок в порядке.'))
+            return
+        if options['check']:
+            raise CommandError('Списки покупок не совпадают с корзинами.')
+        ShoppingCartIngredient.objects.filter(pk__in=extra).delete()
+        ShoppingCartIngredient.objects.bulk_update(wrong, ('amount',))
+        ShoppingCartIngredient.objects.bulk_create(missing)
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересчитаны.'))
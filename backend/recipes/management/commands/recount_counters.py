@@ -0,0 +1,38 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe
+from users.models import Subscription, User
+
+
+def count_of(queryset, field):
+    """Подзапрос числа строк queryset, ссылающихся на текущую запись."""
+
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Пересчет счетчиков рецептов и пользователей.'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.update(
+            favorites_count=count_of(
+                Recipe.favorites.through.objects.all(), 'recipe'),
+            shopping_cart_count=count_of(
+                Recipe.shopping_cart.through.objects.all(), 'recipe'),
+        )
+        users = User.objects.update(
+            recipes_count=count_of(Recipe.objects.all(), 'author'),
+            followers_count=count_of(Subscription.objects.all(), 'author'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}.'))
@@ -0,0 +1,22 @@
+from django.core.management import BaseCommand
+
+from utils.constans import RECIPE_FILES_GRACE
+from utils.services import sweep_recipe_files
+
+
+class Command(BaseCommand):
+    help = 'Удаление файлов рецептов, на которые нет ссылок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=RECIPE_FILES_GRACE,
+            help='Не трогать файлы, измененные за это число секунд.'
+        )
+
+    def handle(self, *args, **options):
+        deleted, kept = sweep_recipe_files(options['grace'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов: {deleted}, оставлено до следующего '
+            f'прохода: {kept}.'))
@@ -1,9 +1,13 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 from colorfield.fields import ColorField
 
 from users.models import User
 from utils.constans import MAX_LENGTH, MAX_VALUE, MIN_VALUE
+from utils.models import CountersMixin
+from utils.storage import ContentAddressedStorage
 from utils.validators import validate_slug, validate_value_greater_zero
 
 
@@ -51,14 +55,71 @@ class Ingredient(models.Model):
         verbose_name = 'Ингридиент'
         verbose_name_plural = 'Ингридиенты'
         ordering = ('name',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient'),
+        )
 
     def __str__(self):
         return f'{self.name} ({self.measurement_unit})'
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Выборка рецептов для отображения в API."""
+
+    def with_related(self):
+        """Автор, теги и ингредиенты с количеством для всей выборки."""
+
+        return self.select_related('author').prefetch_related(
+            'tags',
+            models.Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient').order_by('ingredient__name')),
+        )
+
+    def with_user_flags(self, user):
+        """Флаги избранного и списка покупок для всей выборки сразу."""
+
+        if user.is_anonymous:
+            return self
+        return self.annotate(
+            is_favorited=models.Exists(
+                self.model.favorites.through.objects.filter(
+                    recipe=models.OuterRef('pk'), user=user)),
+            is_in_shopping_cart=models.Exists(
+                self.model.shopping_cart.through.objects.filter(
+                    recipe=models.OuterRef('pk'), user=user)),
+        )
+
+    def first_per_author(self, limit):
+        """Первые limit рецептов каждого автора выборки.
+
+        Отбор делается в БД через ROW_NUMBER() OVER (PARTITION BY author),
+        поэтому для любого числа авторов нужен один запрос.
+        """
+
+        sql, params = self.annotate(
+            row_number=models.Window(
+                expression=RowNumber(),
+                partition_by=models.F('author_id'),
+                order_by=(models.F('created').asc(), models.F('id').asc()),
+            )
+        ).order_by().values('id', 'row_number').query.sql_with_params()
+        return self.model.objects.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            'WHERE ranked.row_number <= %s',
+            (*params, limit),
+        )).order_by('created', 'id')
+
+
+class Recipe(CountersMixin, models.Model):
     """Модель рецепта"""
 
+    derived_fields = ('favorites_count', 'shopping_cart_count',
+                      'thumbnail', 'thumbnail_webp')
+
     name = models.CharField(
         max_length=MAX_LENGTH,
         verbose_name='Hазвание рецепта',
@@ -72,8 +133,21 @@ class Recipe(models.Model):
         verbose_name='Автор рецепта')
     image = models.ImageField(
         upload_to='recipes/',
+        storage=ContentAddressedStorage(),
         null=True,
         blank=True)
+    thumbnail = models.ImageField(
+        upload_to='recipes/thumbnails/',
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Миниатюра JPEG')
+    thumbnail_webp = models.ImageField(
+        upload_to='recipes/thumbnails/',
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Миниатюра WebP')
     cooking_time = models.PositiveSmallIntegerField(
         validators=[MinValueValidator(MIN_VALUE), MaxValueValidator(MAX_VALUE),
                     validate_value_greater_zero],
@@ -101,11 +175,26 @@ class Recipe(models.Model):
     created = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата и время публикации рецепта',)
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном')
+    shopping_cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок')
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('created',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('created', 'id'),
+                name='recipe_created_id_idx'),
+        )
 
     def __str__(self):
         return self.name
@@ -139,3 +228,31 @@ class RecipeIngredient(models.Model):
 
     def __str__(self):
         return f'{self.ingredient} {self.recipe}'
+
+
+class ShoppingCartIngredient(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя"""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь')
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_lists',
+        verbose_name='Ингредиент')
+    amount = models.IntegerField(
+        verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_ingredient')]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} {self.amount}'
@@ -0,0 +1,135 @@
+import logging
+import re
+
+from django.db import OperationalError, connections
+from django.db.models import (BooleanField, Case, FloatField, IntegerField, Q,
+                              Value, When)
+from django.db.models.expressions import RawSQL
+
+from utils.constans import FUZZY_SEARCH_THRESHOLD, SEARCH_CONFIG
+
+logger = logging.getLogger(__name__)
+
+RECIPE_VECTOR = (
+    "setweight(to_tsvector('{config}', coalesce({table}.name, '')), 'A') || "
+    "setweight(to_tsvector('{config}', coalesce({table}.text, '')), 'B')"
+)
+
+POSTGRES_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+    'ON recipes_ingredient USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_upper_name_trgm '
+    'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search '
+    'ON recipes_recipe USING gin (({}))'.format(
+        RECIPE_VECTOR.format(config=SEARCH_CONFIG, table='recipes_recipe')),
+)
+
+SQLITE_INDEXES = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts USING fts5("
+    "name, text, content='recipes_recipe', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert "
+    "AFTER INSERT ON recipes_recipe BEGIN "
+    "INSERT INTO recipes_recipe_fts(rowid, name, text) "
+    "VALUES (new.id, new.name, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete "
+    "AFTER DELETE ON recipes_recipe BEGIN "
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text) "
+    "VALUES ('delete', old.id, old.name, old.text); END",
+    "CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update "
+    "AFTER UPDATE OF name, text ON recipes_recipe BEGIN "
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text) "
+    "VALUES ('delete', old.id, old.name, old.text); "
+    "INSERT INTO recipes_recipe_fts(rowid, name, text) "
+    "VALUES (new.id, new.name, new.text); END",
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts) VALUES ('rebuild')",
+)
+
+
+def create_search_indexes(using='default', **kwargs):
+    """Индексы поиска, которые нельзя описать в Meta моделей.
+
+    Подключается к post_migrate. На PostgreSQL создаёт расширение
+    pg_trgm, триграммные GIN-индексы по названию ингредиента и GIN-индекс
+    по tsvector рецепта. На SQLite создаёт таблицу FTS5 для рецептов
+    и триггеры, которые обновляют её при сохранении рецепта.
+    """
+
+    connection = connections[using]
+    statements = {
+        'postgresql': POSTGRES_INDEXES,
+        'sqlite': SQLITE_INDEXES,
+    }.get(connection.vendor, ())
+    try:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    except OperationalError as error:
+        logger.warning('Индексы поиска не созданы: %s', error)
+
+
+def search_recipes(queryset, query):
+    """Полнотекстовый поиск по названию и описанию рецепта.
+
+    Добавляет к выборке поле search_rank (больше — релевантнее)
+    и сортирует по нему.
+    """
+
+    words = re.findall(r'\w+', query)
+    if not words:
+        return queryset
+    table = queryset.model._meta.db_table
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        vector = RECIPE_VECTOR.format(config=SEARCH_CONFIG, table=table)
+        tsquery = ' & '.join(f'{word}:*' for word in words)
+        condition = RawSQL(
+            f"{vector} @@ to_tsquery(%s, %s)", (SEARCH_CONFIG, tsquery),
+            output_field=BooleanField())
+        rank = RawSQL(
+            f"ts_rank({vector}, to_tsquery(%s, %s))",
+            (SEARCH_CONFIG, tsquery), output_field=FloatField())
+    elif vendor == 'sqlite':
+        match = ' '.join(f'"{word}"*' for word in words)
+        condition = RawSQL(
+            f'{table}.id IN (SELECT rowid FROM {table}_fts '
+            f'WHERE {table}_fts MATCH %s)', (match,),
+            output_field=BooleanField())
+        rank = RawSQL(
+            f'(SELECT -bm25({table}_fts, 10.0, 1.0) FROM {table}_fts '
+            f'WHERE {table}_fts MATCH %s AND rowid = {table}.id)',
+            (match,), output_field=FloatField())
+    else:
+        condition = Q()
+        for word in words:
+            condition &= Q(name__icontains=word) | Q(text__icontains=word)
+        rank = Case(
+            When(name__icontains=words[0], then=Value(1.0)),
+            default=Value(0.0), output_field=FloatField())
+    return queryset.filter(condition).annotate(
+        search_rank=rank).order_by('-search_rank', '-created')
+
+
+def fuzzy_search_ingredients(queryset, name, limit):
+    """Ранжированный поиск на PostgreSQL.
+
+    Сначала совпадения по началу названия, затем по подстроке, затем
+    похожие по триграммам в порядке убывания сходства.
+    """
+
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    return queryset.annotate(
+        rank=Case(
+            When(name__istartswith=name, then=Value(0)),
+            When(name__icontains=name, then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        ),
+        similarity=TrigramSimilarity('name', name),
+    ).filter(
+        Q(name__icontains=name) | Q(name__trigram_similar=name),
+        Q(rank__lt=2) | Q(similarity__gte=FUZZY_SEARCH_THRESHOLD),
+    ).order_by('rank', '-similarity', 'name')[:limit]
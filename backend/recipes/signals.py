@@ -0,0 +1,216 @@
+from django.conf import settings
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from jobs.registry import enqueue
+from users.models import User
+from utils.cache import bump_version_on_commit
+from utils.constans import CACHE_WARM_DELAY
+from utils.services import (add_to_shopping_list, change_counters,
+                            change_shopping_lists, recipe_amounts,
+                            remove_from_shopping_list, schedule_files_sweep,
+                            schedule_thumbnails)
+from .models import Ingredient, Recipe, RecipeIngredient, Tag
+
+M2M_CHANGES = ('post_add', 'post_remove', 'post_clear')
+LIST_COUNTERS = {
+    Recipe.favorites.through: 'favorites_count',
+    Recipe.shopping_cart.through: 'shopping_cart_count',
+}
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipes_changed(sender, **kwargs):
+    """Изменились данные, которые входят в ответы API рецептов."""
+
+    bump_version_on_commit('recipes')
+    if settings.JOBS_ENABLED:
+        enqueue('api.tasks.warm_recipe_pages',
+                dedup_key='warm_recipe_pages', delay=CACHE_WARM_DELAY)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_counters(
+            User.objects.filter(pk=instance.author_id), recipes_count=1)
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_image_saving(sender, instance, raw=False, **kwargs):
+    """Запоминает старую картинку, чтобы освободить ее после замены."""
+
+    if not raw and not instance._state.adding:
+        instance.previous_image = Recipe.objects.filter(
+            pk=instance.pk).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, 'previous_image', None)
+    if previous and previous != instance.image.name:
+        schedule_files_sweep()
+    schedule_thumbnails(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed(sender, instance, **kwargs):
+    change_counters(
+        User.objects.filter(pk=instance.author_id), recipes_count=-1)
+    if instance.image:
+        schedule_files_sweep()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tags_changed(sender, **kwargs):
+    bump_version_on_commit('tags', 'recipes')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    bump_version_on_commit('ingredients', 'recipes')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, action, **kwargs):
+    if action in M2M_CHANGES:
+        bump_version_on_commit('recipes')
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, update_fields=None, **kwargs):
+    """Данные автора выводятся в каждом рецепте."""
+
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_version_on_commit('recipes')
+
+
+@receiver(m2m_changed, sender=Recipe.favorites.through)
+@receiver(m2m_changed, sender=Recipe.shopping_cart.through)
+def user_lists_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Избранное или корзина изменены в обход API (админка, shell).
+
+    API пишет связи напрямую и сам вызывает list_changed, а здесь
+    то же делается по парам (пользователь, рецепт), которые
+    действительно добавлены или удалены.
+    """
+
+    if action in ('pre_remove', 'pre_clear'):
+        # После удаления уже не узнать, какие связи существовали.
+        instance._removed_pairs = list_pairs(
+            sender, instance, reverse, pk_set)
+        return
+    if action not in M2M_CHANGES:
+        return
+    if action == 'post_add':
+        delta = 1
+        pairs = {
+            (instance.pk, pk) if reverse else (pk, instance.pk)
+            for pk in pk_set
+        }
+    else:
+        delta = -1
+        pairs = instance.__dict__.pop('_removed_pairs', set())
+    if not pairs:
+        return
+    counter = LIST_COUNTERS[sender]
+    if reverse:
+        change_counters(Recipe.objects.filter(
+            pk__in={recipe_id for _, recipe_id in pairs}), **{counter: delta})
+    else:
+        change_counters(Recipe.objects.filter(
+            pk=instance.pk), **{counter: delta * len(pairs)})
+    bump_version_on_commit(*{f'user:{user_id}' for user_id, _ in pairs})
+    if sender is Recipe.shopping_cart.through:
+        shopping_lists_changed(pairs, delta)
+
+
+def shopping_lists_changed(pairs, delta):
+    """Рецепты пар (пользователь, рецепт) прибавляются к спискам
+    покупок или вычитаются из них."""
+
+    callback = add_to_shopping_list if delta > 0 else remove_from_shopping_list
+    recipes = {}
+    for user_id, recipe_id in pairs:
+        recipes.setdefault(user_id, []).append(recipe_id)
+    for user_id, recipe_ids in recipes.items():
+        callback(User(pk=user_id), *recipe_ids)
+
+
+def list_pairs(sender, instance, reverse, pk_set):
+    """Существующие пары (id пользователя, id рецепта) связи sender;
+    pk_set None означает все связи instance."""
+
+    source, target = ('user', 'recipe') if reverse else ('recipe', 'user')
+    rows = sender.objects.filter(**{source: instance.pk})
+    if pk_set is not None:
+        rows = rows.filter(**{f'{target}__in': pk_set})
+    return set(rows.values_list('user_id', 'recipe_id'))
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Удаленный рецепт убирается из списков покупок."""
+
+    change_shopping_lists(
+        instance.shopping_cart.values_list('id', flat=True),
+        {
+            ingredient_id: -amount
+            for ingredient_id, amount in recipe_amounts(instance.pk).items()
+        }
+    )
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_saving(sender, instance, raw=False, **kwargs):
+    """Запоминает прежнюю строку, чтобы вычесть ее из списков покупок."""
+
+    if not raw and not instance._state.adding:
+        instance.previous_row = RecipeIngredient.objects.filter(
+            pk=instance.pk).values_list('ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, raw=False, **kwargs):
+    """Правка ингредиента по одному (например, в админке).
+
+    API меняет ингредиенты пачками без сигналов и само
+    обновляет списки покупок.
+    """
+
+    if raw:
+        return
+    amounts = {instance.ingredient_id: instance.amount}
+    previous = getattr(instance, 'previous_row', None)
+    if previous is not None:
+        ingredient_id, amount = previous
+        amounts[ingredient_id] = amounts.get(ingredient_id, 0) - amount
+    change_shopping_lists(
+        User.objects.filter(
+            shopping_cart=instance.recipe_id).values_list('id', flat=True),
+        amounts
+    )
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_removed(sender, instance, **kwargs):
+    """Удаленный ингредиент вычитается из списков покупок.
+
+    При удалении всего рецепта корзины к этому моменту уже очищены
+    каскадом, и вычитает только recipe_deleted.
+    """
+
+    change_shopping_lists(
+        User.objects.filter(
+            shopping_cart=instance.recipe_id).values_list('id', flat=True),
+        {instance.ingredient_id: -instance.amount}
+    )
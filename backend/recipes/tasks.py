@@ -0,0 +1,15 @@
+from jobs.registry import task
+from utils.services import (make_thumbnails, schedule_files_sweep,
+                            sweep_recipe_files)
+
+
+@task
+def create_thumbnails(recipe_id):
+    make_thumbnails(recipe_id)
+
+
+@task
+def sweep_files():
+    _, kept = sweep_recipe_files()
+    if kept:
+        schedule_files_sweep()
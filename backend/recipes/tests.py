@@ -0,0 +1,191 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCartIngredient, Tag)
+from users.models import User
+from utils.constans import RECIPE_FILES_GRACE
+from utils.services import sweep_recipe_files
+
+
+class ShoppingListTests(TestCase):
+    """Сводные списки покупок совпадают с корзинами после любых правок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            'author', 'author@example.com', 'password',
+            first_name='Автор', last_name='Рецептов')
+        cls.buyer = User.objects.create_user(
+            'buyer', 'buyer@example.com', 'password',
+            first_name='Покупатель', last_name='Продуктов')
+        cls.tag = Tag.objects.create(
+            name='Обед', color='#49B64E', slug='lunch')
+        cls.ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'сахар', 'соль')
+        ]
+
+    def setUp(self):
+        self.recipe = self.create_recipe(
+            {self.ingredients[0]: 100, self.ingredients[1]: 50})
+        self.buyer_client = APIClient()
+        self.buyer_client.force_authenticate(self.buyer)
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.author)
+
+    def create_recipe(self, amounts):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Пирог', text='Испечь.',
+            cooking_time=30)
+        recipe.tags.add(self.tag)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=amount)
+            for ingredient, amount in amounts.items()
+        )
+        return recipe
+
+    def add_to_cart(self, recipe):
+        response = self.buyer_client.post(
+            f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def shopping_list(self):
+        return dict(ShoppingCartIngredient.objects.filter(
+            user=self.buyer).values_list('ingredient__name', 'amount'))
+
+    def assertListsConsistent(self):
+        try:
+            call_command('rebuild_shopping_lists', check=True,
+                         stdout=StringIO())
+        except CommandError as error:
+            self.fail(error)
+
+    def test_add_and_remove(self):
+        other = self.create_recipe({self.ingredients[1]: 25})
+        self.add_to_cart(self.recipe)
+        self.add_to_cart(other)
+        self.assertEqual(self.shopping_list(), {'мука': 100, 'сахар': 75})
+        self.assertListsConsistent()
+        response = self.buyer_client.delete(
+            f'/api/recipes/{self.recipe.pk}/shopping_cart/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.shopping_list(), {'сахар': 25})
+        self.assertListsConsistent()
+
+    def test_bulk_add_and_remove(self):
+        other = self.create_recipe({self.ingredients[2]: 5})
+        ids = {'ids': [self.recipe.pk, other.pk]}
+        self.buyer_client.post(
+            '/api/recipes/bulk_shopping_cart/', ids, format='json')
+        self.assertEqual(
+            self.shopping_list(), {'мука': 100, 'сахар': 50, 'соль': 5})
+        self.assertListsConsistent()
+        self.buyer_client.delete(
+            '/api/recipes/bulk_shopping_cart/', ids, format='json')
+        self.assertEqual(self.shopping_list(), {})
+        self.assertListsConsistent()
+
+    def test_recipe_update(self):
+        self.add_to_cart(self.recipe)
+        response = self.author_client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {
+                'name': 'Пирог',
+                'text': 'Испечь.',
+                'cooking_time': 30,
+                'tags': [self.tag.pk],
+                'ingredients': [
+                    {'id': self.ingredients[1].pk, 'amount': 70},
+                    {'id': self.ingredients[2].pk, 'amount': 3},
+                ],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.shopping_list(), {'сахар': 70, 'соль': 3})
+        self.assertListsConsistent()
+
+    def test_recipe_delete(self):
+        self.add_to_cart(self.recipe)
+        response = self.author_client.delete(
+            f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.shopping_list(), {})
+        self.assertListsConsistent()
+
+    def test_changes_outside_api(self):
+        self.recipe.shopping_cart.add(self.buyer)
+        self.assertEqual(self.shopping_list(), {'мука': 100, 'сахар': 50})
+        row = self.recipe.recipe_ingredient.get(
+            ingredient=self.ingredients[0])
+        row.ingredient = self.ingredients[2]
+        row.amount = 10
+        row.save()
+        self.recipe.recipe_ingredient.get(
+            ingredient=self.ingredients[1]).delete()
+        self.assertEqual(self.shopping_list(), {'соль': 10})
+        self.assertListsConsistent()
+        self.buyer.shopping_cart.clear()
+        self.assertEqual(self.shopping_list(), {})
+        self.assertListsConsistent()
+
+
+class RecipeFilesTests(TestCase):
+    """Общие файлы картинок удаляются сборщиком, когда ссылок не осталось."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            'author', 'author@example.com', 'password',
+            first_name='Автор', last_name='Рецептов')
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def create_recipe(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Пирог', text='Испечь.',
+            cooking_time=30)
+        recipe.image.save('pie.png', ContentFile(b'picture'))
+        return recipe
+
+    def age(self, name):
+        moment = time.time() - RECIPE_FILES_GRACE - 1
+        os.utime(Recipe.image.field.storage.path(name), (moment, moment))
+
+    def test_shared_image(self):
+        first = self.create_recipe()
+        second = self.create_recipe()
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.age(name)
+        first.delete()
+        self.assertEqual(sweep_recipe_files(), (0, 0))
+        second.delete()
+        self.assertEqual(sweep_recipe_files(), (1, 0))
+        self.assertFalse(Recipe.image.field.storage.exists(name))
+
+    def test_reused_image_is_kept(self):
+        recipe = self.create_recipe()
+        name = recipe.image.name
+        recipe.delete()
+        self.age(name)
+        self.create_recipe().delete()
+        self.assertEqual(sweep_recipe_files(), (0, 1))
+        self.age(name)
+        self.assertEqual(sweep_recipe_files(), (1, 0))
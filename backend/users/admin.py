@@ -10,6 +10,8 @@ class UserProfileAdmin(admin.ModelAdmin):
         'first_name',
         'last_name',
         'password',
+        'recipes_count',
+        'followers_count',
     )
     list_filter = (
         'email',
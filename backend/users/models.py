@@ -2,12 +2,15 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 from utils.constans import MAX_LENGTH_EMAIL, MAX_LENGTH_USER
+from utils.models import CountersMixin
 from utils.validators import validate_username
 
 
-class User(AbstractUser):
+class User(CountersMixin, AbstractUser):
     """Кастомная модель User"""
 
+    derived_fields = ('recipes_count', 'followers_count')
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -44,6 +47,16 @@ class User(AbstractUser):
         max_length=MAX_LENGTH_USER,
         verbose_name='Пароль',
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков',
+    )
 
     def __str__(self):
         return self.username
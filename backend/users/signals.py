@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from utils.cache import bump_version_on_commit
+from utils.services import change_counters
+from .models import Subscription, User
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def subscriptions_changed(sender, instance, **kwargs):
+    """Подписка меняет is_subscribed в ответах подписчика."""
+
+    bump_version_on_commit(f'user:{instance.subscriber_id}')
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    if created:
+        change_counters(
+            User.objects.filter(pk=instance.author_id), followers_count=1)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_removed(sender, instance, **kwargs):
+    change_counters(
+        User.objects.filter(pk=instance.author_id), followers_count=-1)
@@ -0,0 +1,69 @@
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'version:{}'
+
+_bumps = threading.local()
+
+
+def get_version(namespace):
+    """Текущая версия данных (время последнего изменения в наносекундах)."""
+
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(*namespaces):
+    """Сдвиг версии: закэшированные под старой версией данные устаревают.
+
+    Версия растет минимум на секунду: Last-Modified точен до секунды,
+    и правка в ту же секунду иначе отдала бы устаревший 304.
+    """
+
+    keys = {namespace: VERSION_KEY.format(namespace)
+            for namespace in namespaces}
+    previous = cache.get_many(keys.values())
+    now = time.time_ns()
+    versions = {
+        key: max(now, previous[key] + 10 ** 9) if key in previous else now
+        for key in keys.values()
+    }
+    cache.set_many(versions, None)
+    for namespace, key in keys.items():
+        setattr(_bumps, namespace, (previous.get(key), versions[key]))
+
+
+def bump_version_on_commit(*namespaces):
+    """Сдвиг версии после фиксации текущей транзакции.
+
+    До фиксации другие запросы не видят новых данных и закэшировали бы
+    старые под новой версией; при откате версия не меняется.
+    """
+
+    transaction.on_commit(lambda: bump_version(*namespaces))
+
+
+def last_bump(namespace):
+    """Версии до и после последнего сдвига в текущем потоке."""
+
+    return getattr(_bumps, namespace, (None, None))
+
+
+def make_digest(*parts):
+    return hashlib.md5(
+        '|'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+
+
+def make_key(prefix, *parts):
+    """Ключ кэша фиксированной длины."""
+
+    return f'{prefix}:{make_digest(*parts)}'
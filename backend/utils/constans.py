@@ -6,9 +6,50 @@ MIN_VALUE = 1
 VALUE_ZERO = 0
 MAX_PAGE_SIZE = 6
 RECIPES_LIMIT = 6
+BULK_IDS_LIMIT = 100
+CACHE_TIMEOUT = 60 * 15
+INGREDIENTS_SEARCH_LIMIT = 50
+FUZZY_SEARCH_THRESHOLD = 0.3
+SEARCH_CONFIG = 'russian'
 FONT_HEIGHT = 24
 VERTICAL_POSITION_TITUL_ON_PAGE = 200
 HORISONTAL_POSITION_TITUL_ON_PAGE = 800
 VERTICAL_POSITION_TEXT_ON_PAGE = 750
 HORISONTAL_POSITION_TEXT_ON_PAGE = 50
 MAX_INTERVAL_LINES = 20
+PDF_FONT = 'DejaVuSans'
+PDF_RENDER_WORKERS = 2
+PDF_RENDER_TIMEOUT = 5
+PDF_CACHE_TIMEOUT = 60 * 60 * 24
+MAX_IMAGE_SIZE = 5 * 1024 * 1024
+MAX_IMAGE_DIMENSION = 4096
+MAX_REQUEST_SIZE = MAX_IMAGE_SIZE * 4 // 3 + 1024 * 1024
+BASE64_CHUNK_SIZE = 64 * 1024
+IMAGE_FORMATS = ('jpeg', 'jpg', 'png', 'gif', 'webp')
+THUMBNAIL_SIZE = (480, 480)
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_WORKERS = 2
+RECIPE_FILES_GRACE = 60 * 60
+ASYNC_READ_WORKERS = 16
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY = 10
+JOB_TIMEOUT = 60 * 10
+JOB_KEEP_DONE = 60 * 60 * 24
+JOB_KEEP_FAILED = 60 * 60 * 24 * 7
+JOBS_PRUNE_INTERVAL = 60 * 60
+JOBS_WORKERS = 2
+JOBS_POLL_INTERVAL = 1
+CACHE_WARM_DELAY = 5
+CACHE_WARM_PAGES = 3
+IMPORT_BATCH_SIZE = 1000
+IMPORT_READ_SIZE = 64 * 1024
+GENERATE_SKEW = 1.1
+GENERATE_INGREDIENTS = (3, 12)
+GENERATE_TAGS = (1, 3)
+GENERATE_MAX_MISSES = 10
+BENCHMARK_REPEAT = 20
+BENCHMARK_TOLERANCE = 0.5
+BENCHMARK_BYTES_TOLERANCE = 0.05
+BENCHMARK_LATENCY_SLACK = 5
+BENCHMARK_SETTLE_TIMEOUT = 5
+BENCHMARK_BASELINE = 'benchmark_baseline.json'
@@ -0,0 +1,18 @@
+class CountersMixin:
+    """Модель с полями, которые меняются только отдельными UPDATE.
+
+    Это счетчики, которые сдвигаются через F(), и результаты фоновых
+    задач. Обычное сохранение записи их не перезаписывает, иначе оно
+    затирало бы изменения, сделанные после чтения записи.
+    """
+
+    derived_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.derived_fields
+            ]
+        super().save(*args, **kwargs)
@@ -1,70 +1,533 @@
+import csv
 import io
+import json
+import logging
+import os
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from datetime import timedelta
+from functools import lru_cache
+from itertools import chain
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from PIL import Image, ImageOps
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 from rest_framework import status
 from rest_framework.response import Response
 
-from recipes.models import Recipe
+from jobs.registry import enqueue
+from recipes.models import Recipe, RecipeIngredient, ShoppingCartIngredient
+from .cache import bump_version, bump_version_on_commit, make_key
 from .constans import (FONT_HEIGHT, HORISONTAL_POSITION_TEXT_ON_PAGE,
                        HORISONTAL_POSITION_TITUL_ON_PAGE, MAX_INTERVAL_LINES,
-                       MIN_VALUE, VERTICAL_POSITION_TEXT_ON_PAGE,
+                       MIN_VALUE, PDF_CACHE_TIMEOUT, PDF_FONT,
+                       PDF_RENDER_TIMEOUT, PDF_RENDER_WORKERS,
+                       RECIPE_FILES_GRACE, THUMBNAIL_QUALITY, THUMBNAIL_SIZE,
+                       THUMBNAIL_WORKERS, VERTICAL_POSITION_TEXT_ON_PAGE,
                        VERTICAL_POSITION_TITUL_ON_PAGE)
+from .storage import touch
+
+logger = logging.getLogger(__name__)
+
+pdf_executor = ThreadPoolExecutor(max_workers=PDF_RENDER_WORKERS)
+pdf_slots = threading.BoundedSemaphore(PDF_RENDER_WORKERS * 2)
+thumbnail_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+
+THUMBNAIL_FORMATS = (
+    ('thumbnail', 'jpg', 'JPEG'),
+    ('thumbnail_webp', 'webp', 'WEBP'),
+)
+RECIPE_FILE_FIELDS = ('image', 'thumbnail', 'thumbnail_webp')
+
+
+def pdf_font_available():
+    """Без шрифта с кириллицей PDF не выдается: текст был бы нечитаем."""
+
+    return os.path.exists(settings.PDF_FONT_PATH)
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    """Регистрирует шрифт для PDF один раз на процесс."""
+
+    pdfmetrics.registerFont(TTFont(PDF_FONT, settings.PDF_FONT_PATH))
+    return PDF_FONT
 
 
 def create_shopping_cart(ingredients_cart):
     """Функция для формирования списка покупок для скачивания."""
 
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = (
-        "attachment; filename='shopping_cart.pdf'"
-    )
-    pdfmetrics.registerFont(
-        TTFont('Arial', 'data/arial.ttf', 'UTF-8')
-    )
+    font = register_font()
     buffer = io.BytesIO()
     pdf_file = canvas.Canvas(buffer)
-    pdf_file.setFont('Arial', FONT_HEIGHT)
+    pdf_file.setFont(font, FONT_HEIGHT)
     pdf_file.drawString(VERTICAL_POSITION_TITUL_ON_PAGE,
                         HORISONTAL_POSITION_TITUL_ON_PAGE,
                         'Список покупок.')
-    pdf_file.setFont('Arial', FONT_HEIGHT)
+    pdf_file.setFont(font, FONT_HEIGHT)
     from_bottom = VERTICAL_POSITION_TEXT_ON_PAGE
     for number, ingredient in enumerate(ingredients_cart, start=MIN_VALUE):
         pdf_file.drawString(
             HORISONTAL_POSITION_TEXT_ON_PAGE,
             from_bottom,
             f"{number}. {ingredient['ingredient__name']}: "
-            f"{ingredient['ingredient_value']} "
+            f"{ingredient['total_amount']} "
             f"{ingredient['ingredient__measurement_unit']}.",
         )
         from_bottom -= MAX_INTERVAL_LINES
         if from_bottom <= HORISONTAL_POSITION_TEXT_ON_PAGE:
             from_bottom = HORISONTAL_POSITION_TITUL_ON_PAGE
             pdf_file.showPage()
-            pdf_file.setFont('Arial', FONT_HEIGHT)
+            pdf_file.setFont(font, FONT_HEIGHT)
     pdf_file.showPage()
     pdf_file.save()
     pdf = buffer.getvalue()
     buffer.close()
-    response.write(pdf)
-    return response
+    return pdf
+
+
+def store_shopping_cart_pdf(key, ingredients_cart):
+    pdf = create_shopping_cart(ingredients_cart)
+    cache.set(key, pdf, PDF_CACHE_TIMEOUT)
+    return pdf
+
+
+def render_shopping_cart_pdf(key, ingredients_cart):
+    try:
+        return store_shopping_cart_pdf(key, ingredients_cart)
+    finally:
+        pdf_slots.release()
+
+
+def shopping_cart_pdf(ingredients):
+    """PDF со списком покупок или None, если он ещё не готов.
+
+    Готовый файл хранится в кэше под хэшем содержимого списка, поэтому
+    неизменившийся список повторно не рендерится. Рендер идёт в
+    ограниченном пуле потоков: если он не уложился в PDF_RENDER_TIMEOUT
+    или свободных потоков нет, запрос не ждёт, а файл попадёт в кэш,
+    когда рендер закончится. С JOBS_ENABLED рендер ставится в очередь
+    фоновых задач, и запрос сразу получает None.
+    """
+
+    ingredients = list(ingredients)
+    key = make_key('shopping_cart_pdf', json.dumps(
+        ingredients, ensure_ascii=False, sort_keys=True))
+    pdf = cache.get(key)
+    if pdf is not None:
+        return pdf
+    if settings.JOBS_ENABLED:
+        enqueue('api.tasks.render_shopping_cart_pdf', key, ingredients,
+                dedup_key=key)
+        return None
+    if not pdf_slots.acquire(blocking=False):
+        return None
+    future = pdf_executor.submit(render_shopping_cart_pdf, key, ingredients)
+    try:
+        return future.result(timeout=PDF_RENDER_TIMEOUT)
+    except TimeoutError:
+        return None
+
+
+def image_stem(name):
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def thumbnail_names(recipe):
+    """Имена миниатюр, сделанных из текущей картинки рецепта."""
+
+    stem = image_stem(recipe.image.name)
+    return {
+        field: getattr(recipe, field).field.generate_filename(
+            recipe, f'{stem}.{ext}')
+        for field, ext, _ in THUMBNAIL_FORMATS
+    }
+
+
+def has_thumbnails(recipe):
+    return all(
+        getattr(recipe, field).name == name
+        for field, name in thumbnail_names(recipe).items()
+    )
+
+
+def storage_files(storage, directory):
+    """Имена файлов каталога хранилища вместе с вложенными."""
+
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in directories:
+        yield from storage_files(storage, posixpath.join(directory, name))
+
+
+def sweep_recipe_files(grace=RECIPE_FILES_GRACE):
+    """Удаляет файлы рецептов, на которые не ссылается ни один рецепт.
+
+    Одинаковые картинки хранятся одним файлом, и новый рецепт может
+    взять файл, который другой рецепт только что освободил, до коммита
+    своей транзакции. Повторное использование обновляет время изменения
+    файла, поэтому удаляются только файлы старше grace секунд.
+    Возвращает число удаленных и оставленных до следующего прохода.
+    """
+
+    fields = [Recipe._meta.get_field(name) for name in RECIPE_FILE_FIELDS]
+    referenced = set(chain.from_iterable(
+        Recipe.objects.values_list(*RECIPE_FILE_FIELDS)))
+    expired = timezone.now() - timedelta(seconds=grace)
+    seen = set()
+    deleted = kept = 0
+    for field in fields:
+        storage = field.storage
+        for name in storage_files(storage, field.upload_to.rstrip('/')):
+            path = storage.path(name)
+            if name in referenced or path in seen:
+                continue
+            seen.add(path)
+            if storage.get_modified_time(name) > expired:
+                kept += 1
+                continue
+            storage.delete(name)
+            deleted += 1
+    return deleted, kept
+
+
+def schedule_files_sweep():
+    """Ставит в очередь сборку освободившихся файлов рецептов.
+
+    Без очереди файлы собирает команда sweep_recipe_files.
+    """
+
+    if settings.JOBS_ENABLED:
+        enqueue('recipes.tasks.sweep_files', dedup_key='sweep_recipe_files',
+                delay=RECIPE_FILES_GRACE)
+
+
+def make_thumbnails(recipe_id):
+    """Уменьшенные копии картинки рецепта в JPEG и WebP.
+
+    Миниатюры называются по картинке, поэтому для одинаковых картинок
+    они создаются один раз.
+    """
+
+    recipe = Recipe.objects.only(
+        'image', 'thumbnail', 'thumbnail_webp').get(pk=recipe_id)
+    if not recipe.image or has_thumbnails(recipe):
+        return
+    names = thumbnail_names(recipe)
+    missing = []
+    for field, _, image_format in THUMBNAIL_FORMATS:
+        try:
+            touch(getattr(recipe, field).storage, names[field])
+        except FileNotFoundError:
+            missing.append((field, image_format))
+    if missing:
+        with recipe.image.open('rb'), Image.open(recipe.image) as image:
+            image.draft('RGB', THUMBNAIL_SIZE)
+            image = ImageOps.exif_transpose(image).convert('RGB')
+        image.thumbnail(THUMBNAIL_SIZE)
+    for field, image_format in missing:
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, quality=THUMBNAIL_QUALITY)
+        names[field] = getattr(recipe, field).storage.save(
+            names[field], ContentFile(buffer.getvalue()))
+    replaced = any(
+        getattr(recipe, field).name not in ('', names[field])
+        for field in names
+    )
+    if Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name
+    ).update(**names):
+        bump_version('recipes')
+        if replaced:
+            schedule_files_sweep()
+
+
+def create_thumbnails(recipe_id):
+    """Миниатюры рецепта в фоновом потоке."""
+
+    try:
+        make_thumbnails(recipe_id)
+    except Exception:
+        logger.exception('Не удалось сделать миниатюры рецепта %s',
+                         recipe_id)
+    finally:
+        connection.close()
+
 
+def schedule_thumbnails(recipe):
+    """Ставит создание миниатюр в фоновый пул после коммита."""
 
-def add_or_del_obj(pk, request, param, serializer_context):
-    """"Функция для добавления или удаления объекта"""
+    if not recipe.image:
+        if recipe.thumbnail or recipe.thumbnail_webp:
+            Recipe.objects.filter(pk=recipe.pk).update(
+                thumbnail=None, thumbnail_webp=None)
+            schedule_files_sweep()
+        return
+    if has_thumbnails(recipe):
+        return
+    if settings.JOBS_ENABLED:
+        enqueue('recipes.tasks.create_thumbnails', recipe.pk,
+                dedup_key=f'thumbnails:{recipe.pk}')
+    else:
+        transaction.on_commit(
+            lambda: thumbnail_executor.submit(create_thumbnails, recipe.pk))
 
+
+class Echo:
+    """Буфер для csv.writer, который сразу возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_cart_ingredients(user):
+    """Суммарное количество ингредиентов из списка покупок пользователя."""
+
+    return (
+        ShoppingCartIngredient.objects.filter(user=user)
+        .values(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            total_amount=F('amount'),
+        )
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+        .iterator()
+    )
+
+
+def recipe_amounts(*recipe_ids):
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values('ingredient_id').annotate(
+        total=Sum('amount')
+    ).values_list('ingredient_id', 'total').order_by())
+
+
+def change_shopping_lists(user_ids, amounts):
+    """Прибавляет amounts ({id ингредиента: количество}) к спискам покупок.
+
+    Отрицательные значения вычитаются; строки, в которых не осталось
+    количества, удаляются.
+    """
+
+    user_ids = list(user_ids)
+    amounts = {
+        ingredient_id: amount
+        for ingredient_id, amount in amounts.items() if amount
+    }
+    if not user_ids or not amounts:
+        return
+    ShoppingCartIngredient.objects.bulk_create(
+        (
+            ShoppingCartIngredient(
+                user_id=user_id, ingredient_id=ingredient_id, amount=0)
+            for user_id in user_ids
+            for ingredient_id, amount in amounts.items() if amount > 0
+        ),
+        ignore_conflicts=True
+    )
+    rows = ShoppingCartIngredient.objects.filter(user_id__in=user_ids)
+    rows.filter(ingredient_id__in=amounts).update(amount=F('amount') + Case(
+        *(When(ingredient_id=ingredient_id, then=Value(amount))
+          for ingredient_id, amount in amounts.items()),
+        default=Value(0),
+        output_field=IntegerField(),
+    ))
+    if min(amounts.values()) < 0:
+        rows.filter(amount__lte=0).delete()
+
+
+def add_to_shopping_list(user, *recipe_ids):
+    change_shopping_lists([user.id], recipe_amounts(*recipe_ids))
+
+
+def remove_from_shopping_list(user, *recipe_ids):
+    change_shopping_lists([user.id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in recipe_amounts(*recipe_ids).items()
+    })
+
+
+def stream_shopping_cart(ingredients, export_format):
+    """Построчная выгрузка списка покупок в формате txt, csv или json."""
+
+    if export_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for item in ingredients:
+            yield writer.writerow((
+                item['ingredient__name'],
+                item['ingredient__measurement_unit'],
+                item['total_amount'],
+            ))
+    elif export_format == 'json':
+        separator = ''
+        yield '['
+        for item in ingredients:
+            yield separator + json.dumps({
+                'name': item['ingredient__name'],
+                'measurement_unit': item['ingredient__measurement_unit'],
+                'amount': item['total_amount'],
+            }, ensure_ascii=False)
+            separator = ','
+        yield ']'
+    else:
+        yield 'Cписок покупок:\n'
+        for item in ingredients:
+            yield (
+                f"{item['ingredient__name']} - {item['total_amount']} "
+                f"{item['ingredient__measurement_unit']}.\n"
+            )
+
+
+def change_counters(queryset, **deltas):
+    """Атомарно сдвигает счетчики записей выборки на заданные значения.
+
+    Счетчик не уходит ниже нуля, даже если он еще не пересчитан
+    по старым данным (recount_counters).
+    """
+
+    queryset.update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def list_changed(user, recipe_ids, counter, delta, callback=None):
+    """Обновляет то, что зависит от избранного или списка покупок."""
+
+    change_counters(
+        Recipe.objects.filter(pk__in=recipe_ids), **{counter: delta})
+    if callback is not None:
+        callback(user, *recipe_ids)
+    bump_version_on_commit(f'user:{user.id}')
+
+
+def insert_through_rows(param, pks):
+    """Добавляет связи пользователя с существующими рецептами из pks.
+
+    INSERT ... ON CONFLICT DO NOTHING RETURNING: возвращает id рецептов,
+    строки которых действительно добавлены этим запросом.
+    """
+
+    quote = connection.ops.quote_name
+    through = param.through._meta
+    recipe_column = through.get_field(param.target_field_name).column
+    user_column = through.get_field(param.source_field_name).column
+    recipe_pk = quote(Recipe._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(through.db_table)} '
+            f'({quote(recipe_column)}, {quote(user_column)}) '
+            f'SELECT {recipe_pk}, %s '
+            f'FROM {quote(Recipe._meta.db_table)} '
+            f'WHERE {recipe_pk} IN ({", ".join(["%s"] * len(pks))}) '
+            f'ON CONFLICT DO NOTHING RETURNING {quote(recipe_column)}',
+            (param.instance.pk, *pks)
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def delete_through_rows(param, pks):
+    """Удаляет связи пользователя с рецептами из pks.
+
+    DELETE ... RETURNING: возвращает id рецептов, строки которых
+    действительно удалены этим запросом.
+    """
+
+    quote = connection.ops.quote_name
+    through = param.through._meta
+    recipe_column = quote(through.get_field(param.target_field_name).column)
+    user_column = quote(through.get_field(param.source_field_name).column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(through.db_table)} '
+            f'WHERE {user_column} = %s '
+            f'AND {recipe_column} IN ({", ".join(["%s"] * len(pks))}) '
+            f'RETURNING {recipe_column}',
+            (param.instance.pk, *pks)
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+@transaction.atomic
+def add_or_del_obj(pk, request, param, serializer_context, counter,
+                   on_add=None, on_remove=None):
+    """"Функция для добавления или удаления объекта
+
+    Связь добавляется или удаляется одним запросом без предварительной
+    проверки, поэтому повторные запросы не приводят к гонкам.
+    """
+
+    try:
+        pk = int(pk)
+    except ValueError:
+        raise Http404
+    if request.method == 'DELETE':
+        deleted, _ = param.through.objects.filter(**{
+            param.source_field_name: param.instance.pk,
+            param.target_field_name: pk,
+        }).delete()
+        if deleted:
+            list_changed(request.user, (pk,), counter, -1, on_remove)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+    created = insert_through_rows(param, (pk,))
     obj = get_object_or_404(Recipe, pk=pk)
-    obj_bool = param.filter(pk=obj.pk).exists()
-    if request.method == 'DELETE' and obj_bool:
-        param.remove(obj)
-        return Response(status=status.HTTP_204_NO_CONTENT)
-    if request.method == 'POST' and not obj_bool:
-        param.add(obj)
-        serializer = serializer_context(
-            obj, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-    return Response(status=status.HTTP_400_BAD_REQUEST)
+    if not created:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+    list_changed(request.user, (pk,), counter, 1, on_add)
+    serializer = serializer_context(
+        obj, context={'request': request})
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+@transaction.atomic
+def bulk_add_or_del_objs(ids, request, field, counter,
+                         on_add=None, on_remove=None):
+    """Добавление или удаление списка рецептов одним запросом к БД.
+
+    Для каждого id возвращается код, который вернул бы одиночный запрос.
+    Изменившимися считаются только строки, которые затронул сам запрос,
+    поэтому параллельные запросы не учитываются дважды.
+    """
+
+    user = request.user
+    param = getattr(user, field)
+    found = set(Recipe.objects.filter(
+        pk__in=ids).order_by().values_list('pk', flat=True))
+    if request.method == 'DELETE':
+        changed = delete_through_rows(param, ids)
+        delta, success, callback = -1, status.HTTP_204_NO_CONTENT, on_remove
+    else:
+        changed = insert_through_rows(param, ids)
+        delta, success, callback = 1, status.HTTP_201_CREATED, on_add
+    if changed:
+        list_changed(user, changed, counter, delta, callback)
+    return Response([
+        {
+            'id': pk,
+            'status': (
+                success if pk in changed
+                else status.HTTP_400_BAD_REQUEST if pk in found
+                else status.HTTP_404_NOT_FOUND
+            ),
+        }
+        for pk in ids
+    ])
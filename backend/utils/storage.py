@@ -0,0 +1,45 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором файл называется по sha256 содержимого.
+
+    Одинаковые файлы лежат на диске один раз: если файл с таким
+    содержимым уже есть, запись пропускается, время изменения файла
+    обновляется и возвращается его имя. Удаляет файлы только сборщик
+    (sweep_recipe_files), не трогающий недавно измененные.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        hexdigest = digest.hexdigest()
+        return posixpath.join(
+            directory, hexdigest[:2], hexdigest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        try:
+            touch(self, name)
+        except FileNotFoundError:
+            return super().save(name, content, max_length=max_length)
+        return name
+
+
+def touch(storage, name):
+    """Обновляет время изменения файла: сборщик его пока не удалит."""
+
+    os.utime(storage.path(name))